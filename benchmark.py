@@ -0,0 +1,425 @@
+# benchmark.py
+# Mo 19 Oct 2026
+# Antoine Choffrut
+#
+# Code for benchmarks measuring the time and memory used by 'DynamicSlides'.
+# The benchmarks do not need LaTeX: the .svg files are generated here,
+# in the same format as those produced by dvisvgm.
+# Run for example 'python benchmark.py memory', or 'python benchmark.py' to run all of them.
+
+from constants import *
+from container import Compound, SVGObject, TexObject, read_svg_geometry, d_to_coords_and_commands
+from curve import Point, Circle, Polyline, RasterCanvas, AVATAR_COUNTS
+from effect import Fade, Reveal, Trace, Travel, Wring, Zoom
+from PIL import Image
+import aggdraw
+import math
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import types
+
+# ============================== FUNCTIONS ==============================
+def write_svg_file(file_name, glyph_count = 300, distinct_glyph_count = 40):
+    """ Writes an .svg file with 'glyph_count' glyphs (use elements)
+    referencing 'distinct_glyph_count' glyph paths, in the format produced by dvisvgm.
+    """
+    paths = []
+    for i in range(distinct_glyph_count):
+        w = 3 + (i % 5)*0.7
+        h = 4 + (i % 3)
+        paths.append("<path d='M0.2 0C0.2 %s %s %s %s 0L%s 0.5ZM%s -1L%s -2L%s -1Z' id='g0-%s'/>" \
+                     % (-h, w, -h, w, w/2, w/3, w/2, 2*w/3, i))
+
+    uses = []
+    x = 0
+    for i in range(glyph_count):
+        uses.append("<use x='%s' xlink:href='#g0-%s' y='-65'/>" % (-72 + x, i % distinct_glyph_count))
+        x += 4
+    lines = ["<?xml version='1.0' encoding='UTF-8'?>",
+             "<svg height='9pt' version='1.1' viewBox='-72 -72 %s 9' width='%spt'" % (x, x) \
+             + " xmlns='http://www.w3.org/2000/svg' xmlns:xlink='http://www.w3.org/1999/xlink'>",
+             "<defs>"] \
+             + paths \
+             + ["</defs>",
+                "<g id='page1'>",
+                "<rect height='4.30554' width='0.3985' x='-72' y='-69.30554'/>"] \
+             + uses \
+             + ["</g>",
+                "</svg>"]
+    with open(file_name, 'w') as outfile:
+        outfile.write('\n'.join(lines))
+    return file_name
+
+def deep_getsizeof(obj, seen):
+    """ Returns the number of bytes used by 'obj' and all the objects it refers to,
+    counting only once the objects whose id is in 'seen' (which is updated).
+    """
+    if id(obj) in seen \
+       or isinstance(obj, (type, types.ModuleType, types.FunctionType, types.MethodType)):
+        return 0
+    seen.add(id(obj))
+    result = sys.getsizeof(obj)
+    if isinstance(obj, dict):
+        for key, value in obj.items():
+            result += deep_getsizeof(key, seen) + deep_getsizeof(value, seen)
+    elif isinstance(obj, (list, tuple, set, frozenset)):
+        for item in obj:
+            result += deep_getsizeof(item, seen)
+    if hasattr(obj, '__dict__'):
+        result += deep_getsizeof(obj.__dict__, seen)
+    for aclass in type(obj).__mro__:
+        for slot in aclass.__dict__.get('__slots__', ()):
+            if hasattr(obj, slot):
+                result += deep_getsizeof(getattr(obj, slot), seen)
+    return result
+
+def print_result(label, value, unit = ''):
+    print('{0:<40}'.format(label) + ': ' + '{0:>12}'.format(value) + ' ' + unit)
+
+def time_frames(graphics, frames, raster = False):
+    """ Returns the average time (in seconds) to draw the graphics at the given frames,
+    on a RasterCanvas if 'raster' is True.
+    """
+    img = Image.new('RGBA', (W, H), DEFAULT_BACKGROUND_COLOR)
+    start_time = time.time()
+    for t in frames:
+        if raster:
+            canvas = RasterCanvas(img)
+        else:
+            canvas = aggdraw.Draw(img)
+        for graphic in graphics:
+            graphic.draw(canvas, t)
+        canvas.flush()
+    return (time.time() - start_time)/len(frames)
+
+# ============================== BENCHMARKS ==============================
+def benchmark_memory(glyph_count = 300):
+    """ Measures the memory used by the glyphs of an SVGObject, with and without an effect,
+    and by the glyphs of two SVGObjects read from the same file, after they are scaled and drawn.
+    """
+    print("\nMEMORY (%s glyphs)." % glyph_count)
+    file_name = write_svg_file(os.path.join(tempfile.mkdtemp(), 'memory.svg'), glyph_count)
+    svgobject = SVGObject(file_name)
+
+    seen = set([id(svgobject)])
+    total = deep_getsizeof(svgobject.elements, seen)
+    print_result("bytes per glyph", total/glyph_count, 'bytes')
+
+    svgobject.add_effects(Fade())
+    seen = set([id(svgobject)])
+    total = deep_getsizeof(svgobject.elements, seen)
+    print_result("bytes per glyph (with one effect)", total/glyph_count, 'bytes')
+
+    other_svgobject = SVGObject(file_name)
+    for graphic in (svgobject, other_svgobject):
+        graphic.homothety(graphic.anchor, NORMAL_TEXT_SCALE/4.0, NORMAL_TEXT_SCALE/4.0)
+    time_frames([svgobject, other_svgobject], [0])
+    seen = set([id(svgobject), id(other_svgobject)])
+    total = deep_getsizeof(svgobject.elements, seen) + deep_getsizeof(other_svgobject.elements, seen)
+    print_result("bytes per glyph (two SVGObjects, drawn)", total/(2*glyph_count), 'bytes')
+
+def benchmark_drawing(glyph_count = 300):
+    """ Measures the time to draw the glyphs of an SVGObject, during and after an effect,
+    and counts the glyphs drawn after the effect without building an avatar (see 'Curve.get_drawn_avatar').
+    """
+    print("\nDRAWING (%s glyphs)." % glyph_count)
+    file_name = write_svg_file(os.path.join(tempfile.mkdtemp(), 'drawing.svg'), glyph_count)
+    svgobject = SVGObject(file_name)
+    svgobject.homothety(svgobject.anchor, NORMAL_TEXT_SCALE/4.0, NORMAL_TEXT_SCALE/4.0)
+    svgobject.set_end_time(2*DEFAULT_EFFECT_DURATION)
+    svgobject.add_effects(Fade())
+    frames = range(DEFAULT_EFFECT_DURATION)
+    print_result("time per frame (during Fade)", '{:.2f}'.format(1000*time_frames([svgobject], frames)), 'ms')
+    frames = range(DEFAULT_EFFECT_DURATION, svgobject.end())
+    counts = dict(AVATAR_COUNTS)
+    print_result("time per frame (after Fade)", '{:.2f}'.format(1000*time_frames([svgobject], frames)), 'ms')
+    print_result("curves drawn without avatar (after Fade)", AVATAR_COUNTS['settled'] - counts['settled'])
+    print_result("avatars built (after Fade)", AVATAR_COUNTS['built'] - counts['built'])
+
+def benchmark_memo(glyph_count = 300):
+    """ Measures the time to draw the glyphs of an SVGObject during a Zoom, twice,
+    with and without memoized results (see 'Effect.memoize').
+    """
+    print("\nMEMOIZED EFFECTS (%s glyphs)." % glyph_count)
+    file_name = write_svg_file(os.path.join(tempfile.mkdtemp(), 'memo.svg'), glyph_count)
+    frames = range(DEFAULT_EFFECT_DURATION)
+    for memoized in (False, True):
+        effect = Zoom(center = CENTER, ratio = 3, pace = 'soft landing')
+        if memoized:
+            effect.memoize(levels = 16384, size = 2**15)
+        svgobject = SVGObject(file_name)
+        svgobject.homothety(svgobject.anchor, NORMAL_TEXT_SCALE/4.0, NORMAL_TEXT_SCALE/4.0)
+        svgobject.add_effects(effect)
+        label = "memoized" if memoized else "not memoized"
+        print_result("Zoom, %s, first time" % label, '{:.2f}'.format(1000*time_frames([svgobject], frames)), 'ms')
+        print_result("Zoom, %s, second time" % label, '{:.2f}'.format(1000*time_frames([svgobject], frames)), 'ms')
+
+def benchmark_nesting(depths = (25, 50, 100, 200)):
+    """ Measures the time to build a chain of nested Compound objects,
+    each containing a Point and the previous Compound, and then to delay the outermost one.
+    """
+    print("\nNESTING (chain of Compound objects).")
+    for depth in depths:
+        start_time = time.time()
+        compound = Compound(Point())
+        for i in range(depth - 1):
+            compound = Compound(Point(), compound)
+        build_time = time.time() - start_time
+        start_time = time.time()
+        compound.delay(SECONDS)
+        delay_time = time.time() - start_time
+        print_result("depth %s: build" % depth, '{:.2f}'.format(1000*build_time), 'ms')
+        print_result("depth %s: delay" % depth, '{:.2f}'.format(1000*delay_time), 'ms')
+
+def benchmark_layout(sizes = (10, 20, 40)):
+    """ Measures the time to lay out a grid of N x N points:
+    N rows (Compound objects), each moved in place inside a Compound holding all rows.
+    """
+    print("\nLAYOUT (grid of N x N points).")
+    for size in sizes:
+        start_time = time.time()
+        rows = [Compound(*[Point(center = (i*W/size, 0)) for i in range(size)]) for j in range(size)]
+        grid = Compound(*rows)
+        for j in range(size):
+            rows[j].translate((0, j*H/size))
+        nw_corner = grid.nw()
+        print_result("N = %s" % size, '{:.2f}'.format(1000*(time.time() - start_time)), 'ms')
+
+def benchmark_batch(size = 400):
+    """ Measures the time of a scene script calling move_to, set_times and add_effects
+    on each of 'size' circles held in nested Compound objects, with and without 'batch'.
+    """
+    print("\nBATCH (%s circles)." % size)
+    for use_batch in (False, True):
+        circles = [Circle(center = (i % W, i % H)) for i in range(size)]
+        rows = [Compound(*circles[i:i + 20]) for i in range(0, size, 20)]
+        scene = Compound(*rows)
+        start_time = time.time()
+        if use_batch:
+            with scene.batch():
+                for i, circle in enumerate(circles):
+                    circle.move_to((i*W/size, i*H/size))
+                    circle.set_times((i, i + 2*DEFAULT_EFFECT_DURATION))
+                    circle.add_effects(Fade())
+        else:
+            for i, circle in enumerate(circles):
+                circle.move_to((i*W/size, i*H/size))
+                circle.set_times((i, i + 2*DEFAULT_EFFECT_DURATION))
+                circle.add_effects(Fade())
+        scene.nw()
+        print_result("with batch" if use_batch else "without batch",
+                     '{:.2f}'.format(1000*(time.time() - start_time)), 'ms')
+
+def benchmark_distributive(glyph_count = 1000):
+    """ Measures the time to add a staggered Reveal to the glyphs of an SVGObject,
+    and then to draw them during the Reveal.
+    """
+    print("\nDISTRIBUTIVE EFFECTS (%s glyphs)." % glyph_count)
+    file_name = write_svg_file(os.path.join(tempfile.mkdtemp(), 'distributive.svg'), glyph_count)
+    svgobject = SVGObject(file_name)
+    svgobject.homothety(svgobject.anchor, NORMAL_TEXT_SCALE/8.0, NORMAL_TEXT_SCALE/8.0)
+    start_time = time.time()
+    svgobject.add_effects(Reveal(order = 'random'))
+    print_result("add_effects (Reveal)", '{:.2f}'.format(1000*(time.time() - start_time)), 'ms')
+    frames = range(0, DEFAULT_EFFECT_DURATION, 4)
+    print_result("time per frame (during Reveal)", '{:.2f}'.format(1000*time_frames([svgobject], frames)), 'ms')
+
+def get_peak_memory_increase(file_name):
+    """ Returns the increase (in kB) of the peak memory of a fresh process while it reads the geometry of 'file_name'.
+    The peak of this process would not increase if it was already reached by a previous benchmark.
+    On Linux, the peak is read from /proc (VmHWM): 'ru_maxrss' of a new process starts from that of its parent.
+    """
+    code = '\n'.join(["import os, resource",
+                       "def get_peak_memory():",
+                       "    if os.path.exists('/proc/self/status'):",
+                       "        for line in open('/proc/self/status'):",
+                       "            if line.startswith('VmHWM:'):",
+                       "                return int(line.split()[1])",
+                       "    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss",
+                       "from container import read_svg_geometry",
+                       "peak_memory = get_peak_memory()",
+                       "read_svg_geometry(%r)" % file_name,
+                       "print(get_peak_memory() - peak_memory)"])
+    output = subprocess.Popen([sys.executable, '-c', code], stdout = subprocess.PIPE,
+                              cwd = os.path.dirname(os.path.abspath(__file__))).communicate()[0]
+    return int(output.split()[-1])
+
+def benchmark_loading(glyph_counts = (1000, 10000, 50000)):
+    """ Measures the time to read the geometry of an .svg file, and to build the corresponding SVGObject,
+    as well as the increase of the peak memory of a process while reading it (see 'get_peak_memory_increase').
+    """
+    print("\nLOADING (.svg files).")
+    for glyph_count in glyph_counts:
+        file_name = write_svg_file(os.path.join(tempfile.mkdtemp(), 'loading.svg'), glyph_count)
+        start_time = time.time()
+        geometry = read_svg_geometry(file_name)
+        read_time = time.time() - start_time
+        peak_memory = get_peak_memory_increase(file_name)
+        start_time = time.time()
+        svgobject = SVGObject(file_name)
+        print_result("%s glyphs: read" % glyph_count, '{:.2f}'.format(1000*read_time), 'ms')
+        print_result("%s glyphs: SVGObject" % glyph_count, '{:.2f}'.format(1000*(time.time() - start_time)), 'ms')
+        print_result("%s glyphs: peak memory increase" % glyph_count, peak_memory, 'kB')
+
+def benchmark_paths(segment_counts = (1000, 5000, 20000)):
+    """ Measures the time to read the 'd' attribute of a long path, such as those of maps and plots,
+    made of absolute 'L' and 'C' commands.
+    """
+    print("\nPATHS (long 'd' attributes).")
+    for segment_count in segment_counts:
+        d = ['M0 0']
+        for i in range(segment_count):
+            x, y = 0.25*i, 100*math.sin(0.01*i)
+            if i % 2 == 0:
+                d.append('L%.3f %.3f' % (x, y))
+            else:
+                d.append('C%.3f %.3f %.3f %.3f %.3f %.3f' % (x - 0.2, y + 1, x - 0.1, y - 1, x, y))
+        d = ''.join(d) + 'Z'
+        start_time = time.time()
+        d_to_coords_and_commands(d)
+        print_result("%s segments" % segment_count, '{:.2f}'.format(1000*(time.time() - start_time)), 'ms')
+
+def benchmark_progress(glyph_count = 1000):
+    """ Measures the time to compute the progress rates of the effects of the glyphs of an SVGObject at each frame,
+    for a Fade and a Travel (one effect per glyph) and for a staggered Reveal (held by the SVGObject).
+    """
+    print("\nPROGRESS RATES (%s glyphs)." % glyph_count)
+    file_name = write_svg_file(os.path.join(tempfile.mkdtemp(), 'progress.svg'), glyph_count)
+    frames = range(0, DEFAULT_EFFECT_DURATION)
+    for effect in (Fade(pace = 'smooth'), Travel(center = CENTER), Reveal(order = 'random')):
+        svgobject = SVGObject(file_name)
+        svgobject.add_effects(effect)
+        name = effect.__class__.__name__
+        start_time = time.time()
+        if isinstance(effect, Reveal):
+            for t in frames:
+                for distributed_effect in svgobject.effects:
+                    distributed_effect.get_progress_rates(t)
+        else:
+            effects = [bound_effect for element in svgobject.elements for bound_effect in element.effects]
+            for t in frames:
+                for bound_effect in effects:
+                    bound_effect.get_progress_rate(t)
+        print_result("%s, time per frame" % name, '{:.2f}'.format(1000*(time.time() - start_time)/len(frames)), 'ms')
+
+def benchmark_wring(glyph_count = 300):
+    """ Measures the time per frame to compute the avatars of the glyphs of a TexObject during a Wring,
+    and to draw them.
+    The TexObject is built from a generated .svg file, as from the one produced by dvisvgm for its expression.
+    """
+    print("\nWRING (TexObject, %s glyphs)." % glyph_count)
+    file_name = write_svg_file(os.path.join(tempfile.mkdtemp(), 'wring.svg'), glyph_count)
+    texobject = TexObject.__new__(TexObject)
+    texobject.expression = file_name
+    texobject.initialize(read_svg_geometry(file_name))
+    texobject.add_effects(Wring(amplitude = 0.5))
+    frames = range(0, DEFAULT_EFFECT_DURATION, 4)
+    start_time = time.time()
+    for t in frames:
+        for element in texobject.elements:
+            element.get_avatar(t)
+    print_result("avatars, time per frame", '{:.2f}'.format(1000*(time.time() - start_time)/len(frames)), 'ms')
+    print_result("drawing, time per frame", '{:.2f}'.format(1000*time_frames([texobject], frames)), 'ms')
+
+def benchmark_raster(glyph_count = 1000):
+    """ Measures the time to draw the glyphs of an SVGObject with aggdraw paths and with sprites (on a RasterCanvas),
+    during a Fade, a Travel and a Zoom (which changes the shape of the glyphs, hence is drawn with paths),
+    and after the effects.
+    Under Fade or Travel, and after the effects, the SVGObject is drawn as a single sprite (see 'curve.draw_rigid'),
+    as is a Compound object holding it and other curves, under Fade and after it.
+    """
+    print("\nRASTER (%s glyphs)." % glyph_count)
+    file_name = write_svg_file(os.path.join(tempfile.mkdtemp(), 'raster.svg'), glyph_count)
+    for effect in (Fade(), Travel(center = CENTER), Zoom()):
+        svgobject = SVGObject(file_name)
+        svgobject.homothety(svgobject.anchor, NORMAL_TEXT_SCALE/8.0, NORMAL_TEXT_SCALE/8.0)
+        svgobject.set_end_time(2*DEFAULT_EFFECT_DURATION)
+        svgobject.add_effects(effect)
+        name = effect.__class__.__name__
+        frames = range(0, DEFAULT_EFFECT_DURATION, 4)
+        for raster in (False, True):
+            print_result("%s, %s" % (name, "sprites" if raster else "paths"),
+                         '{:.2f}'.format(1000*time_frames([svgobject], frames, raster)), 'ms')
+    frames = range(DEFAULT_EFFECT_DURATION, svgobject.end(), 4)
+    for raster in (False, True):
+        print_result("after effects, %s" % ("sprites" if raster else "paths"),
+                     '{:.2f}'.format(1000*time_frames([svgobject], frames, raster)), 'ms')
+    svgobject = SVGObject(file_name)
+    svgobject.homothety(svgobject.anchor, NORMAL_TEXT_SCALE/8.0, NORMAL_TEXT_SCALE/8.0)
+    circles = [Circle(center = (W/2 + 30*(i % 20), H/2 + 30*(i // 20))) for i in range(100)]
+    compound = Compound(*[svgobject] + circles)
+    compound.set_end_time(2*DEFAULT_EFFECT_DURATION)
+    compound.add_effects(Fade())
+    for label, frames in (("Fade", range(0, DEFAULT_EFFECT_DURATION, 4)),
+                          ("after Fade", range(DEFAULT_EFFECT_DURATION, compound.end(), 4))):
+        for raster in (False, True):
+            print_result("Compound, %s, %s" % (label, "sprites" if raster else "paths"),
+                         '{:.2f}'.format(1000*time_frames([compound], frames, raster)), 'ms')
+
+def benchmark_trace(vertex_counts = (1000, 10000, 50000)):
+    """ Measures the time per frame to compute the avatar of a closed polygonal curve during a Trace. """
+    print("\nTRACE (closed polygonal curves).")
+    frames = range(DEFAULT_EFFECT_DURATION)
+    for vertex_count in vertex_counts:
+        points = []
+        for i in range(vertex_count):
+            angle = 2*math.pi*i/vertex_count
+            points += [W/2 + H/3*math.cos(angle), H/2 + H/3*math.sin(angle)]
+        polyline = Polyline(tuple(points))
+        polyline.close()
+        polyline.add_effects(Trace(index = 0.5))
+        start_time = time.time()
+        for t in frames:
+            polyline.get_avatar(t)
+        print_result("%s vertices, time per frame" % vertex_count,
+                     '{:.3f}'.format(1000*(time.time() - start_time)/len(frames)), 'ms')
+
+def benchmark_transforms(svgobject_count = 5, operation_count = 100):
+    """ Measures the time of layout operations (translate, homothety, rotate)
+    on a Compound of SVGObjects, and then the time to draw the first frame.
+    """
+    print("\nTRANSFORMS (%s SVGObjects, %s operations)." % (svgobject_count, operation_count))
+    file_name = write_svg_file(os.path.join(tempfile.mkdtemp(), 'transforms.svg'))
+    slide = Compound(*[SVGObject(file_name) for i in range(svgobject_count)])
+    start_time = time.time()
+    for i in range(operation_count):
+        if i % 3 == 0:
+            slide.translate((1, 2))
+        elif i % 3 == 1:
+            slide.homothety(CENTER, 1.01, 0.99)
+        else:
+            slide.rotate(CENTER, 0.01)
+    print_result("layout operations", '{:.2f}'.format(1000*(time.time() - start_time)), 'ms')
+    print_result("first frame", '{:.2f}'.format(1000*time_frames([slide], [0])), 'ms')
+    print_result("next frames", '{:.2f}'.format(1000*time_frames([slide], range(1, 5))), 'ms')
+
+
+BENCHMARKS = {
+    'batch': benchmark_batch,
+    'distributive': benchmark_distributive,
+    'drawing': benchmark_drawing,
+    'trace': benchmark_trace,
+    'transforms': benchmark_transforms,
+    'wring': benchmark_wring,
+    'layout': benchmark_layout,
+    'loading': benchmark_loading,
+    'memo': benchmark_memo,
+    'nesting': benchmark_nesting,
+    'paths': benchmark_paths,
+    'progress': benchmark_progress,
+    'raster': benchmark_raster,
+    'memory': benchmark_memory,
+}
+
+if __name__ == '__main__':
+    names = sys.argv[1:]
+    if names == []:
+        names = sorted(BENCHMARKS.keys())
+    for name in names:
+        if not name in BENCHMARKS.keys():
+            print("WARNING. Unknown benchmark '%s', choose among %s." % (name, sorted(BENCHMARKS.keys())))
+        else:
+            BENCHMARKS[name]()
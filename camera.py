@@ -10,6 +10,7 @@
 from constants import *
 from helpers import *
 from graphic import Graphic
+from curve import RasterCanvas
 from PIL import Image
 import aggdraw
 import os
@@ -50,14 +51,14 @@ class Camera(object):
     def __init__(self, *args):
         self.graphics = list(set([arg for arg in args if isinstance(arg, Graphic)]))
         self.img = Image.new('RGBA', (W, H), DEFAULT_BACKGROUND_COLOR)
-        self.canvas = aggdraw.Draw(self.img)
+        self.canvas = RasterCanvas(self.img)
         self.archive_subdirectory = create_subdirectory(\
                                                         os.getcwd(),
                                                         'ARCHIVES')
 
     def erase(self):
         self.img = Image.new('RGBA', (W, H), DEFAULT_BACKGROUND_COLOR)
-        self.canvas = aggdraw.Draw(self.img)
+        self.canvas = RasterCanvas(self.img)
 
     def main_class_name(self):
         return 'Camera'
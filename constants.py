@@ -52,6 +52,9 @@ TEX_DIR_NAME = 'latex-output'
 TEX_DIR_PATH = os.path.join(os.getcwd(),TEX_DIR_NAME)
 
 TEX_TEXT_TO_REPLACE = 'YourTextHere'
+TEX_PRECOMPILE_PREAMBLE = True # dump the preamble of the template into a format once (see 'helpers.get_tex_format')
+
+SPRITE_MEMORY_BUDGET = 256*2**20 # bytes used at most by the cached sprites (see 'curve.cache_sprite')
 
 MONTHS = ('January', 'February', 'March', 'April', 'May', 'June', 'July', 'August', 'September', 'October', 'November', 'December')
 
@@ -61,6 +64,7 @@ DEFAULT_PEN_COLOR = WHITE
 DEFAULT_PEN_WIDTH = 2
 DEFAULT_BRUSH_COLOR = WHITE
 
+DRAWING_KIT_TAGS = ('pen color', 'pen width', 'brush color')
 DEFAULT_DRAWING_KIT = {'pen color': DEFAULT_PEN_COLOR,'pen width': 1,'brush color': None}
 DEFAULT_TIMELINE_ELEMENT_SEGMENT_DRAWING_KIT = {'pen color': BLACK, 'pen width': 1, 'brush color': None}
 DEFAULT_TIMELINE_ELEMENT_LABEL_DRAWING_KIT = {'pen color': BLACK, 'pen width': 1, 'brush color': BLUE}
@@ -69,6 +73,7 @@ DEFAULT_TIMELINE_EFFECT_LABEL_DRAWING_KIT = {'pen color': RED1, 'pen width': 1,
 
 DEFAULT_PAUSE = 2*SECONDS
 DEFAULT_EFFECT_DURATION = 2*SECONDS 
+EPOCH_TAGS = ('begin time', 'end time')
 DEFAULT_EPOCHS = {'begin time': 0*SECONDS, 'end time': DEFAULT_EFFECT_DURATION}
 DEFAULT_TITLE_DURATION = 5*SECONDS
 
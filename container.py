@@ -6,50 +6,104 @@
 
 
 from geometry import *
-from primitive import Primitive, filter_by_class, extract_times
-from effect import Effect, Fade, Travel, Zoom, Trace, Spin, Sunrise, Reveal, ThreeBlueOneBrown, Trickle, Wring
-from graphic import Graphic
-from curve import Curve, Point, Polyline, RegularPolygon, Circle, Arc, Rectangle
+from primitive import Primitive, Epochs, filter_by_class, extract_times
+from effect import Effect, Fade, Travel, Zoom, Trace, Spin, Sunrise, Reveal, ThreeBlueOneBrown, Trickle, Wring, DistributedEffect
+from graphic import Graphic, Batch, Transforms
+from curve import Curve, Point, Polyline, RegularPolygon, Circle, Arc, Rectangle, draw_batch, d_to_coords_and_commands, \
+    RasterCanvas, draw_sprites, draw_rigid
 import inspect
+import itertools
+import os
+import pickle
 import random
-from xml.dom import minidom
+import threading
+from multiprocessing import cpu_count
+try:
+    import Queue as queue
+except ImportError:
+    import queue
+try:
+    import xml.etree.cElementTree as ElementTree
+except ImportError:
+    import xml.etree.ElementTree as ElementTree
 
 def extract_standalones(alist, subelements):
-    """ Iteratively search for all standalones, i.e. Curve objects or Block objects, and removes duplicates.
+    """ Returns all standalones, i.e. Curve objects or Block objects, found in 'alist' or in 'subelements',
+    without duplicates.
     Standalone objects inside a Block object are not searched.
-    If a Compound object contains other Compound objects, these will be searched iteratively.
+    If a Compound object contains other Compound objects, these are searched through their index.
     """
-    if alist == []:
-        return [element
-                       for element in subelements
-                       if (isinstance(element, Curve) or isinstance(element, Block))]
-    else:
-        new_subelements = subelements \
-                          + [element
-                             for element in alist
-                             if (isinstance(element, Curve) or isinstance(element, Block))]                          
-        new_alist = [elt
-                     for element in alist
-                     if isinstance(element, Compound)
-                     for elt in element.elements]
-                     
-        return list(set(extract_standalones(new_alist, new_subelements)))
+    result = SubelementIndex()
+    for element in subelements:
+        result.add(element)
+    for element in alist:
+        if isinstance(element, Curve) or isinstance(element, Block):
+            result.add(element)
+        elif isinstance(element, Compound):
+            for standalone in element.standalone_index.get(Graphic):
+                result.add(standalone)
+    return result.get(Graphic)
+
+def iterate_drawn_curves(elements, t):
+    """ Yields the curves of 'elements' and of the Container objects among them, in the order in which they are drawn,
+    except that a Block object holding effects which are not over at time t is yielded instead of its curves
+    (see 'draw_rigid').
+    """
+    for element in elements:
+        if isinstance(element, Block) \
+           and not all(effect.initial_filter(None, None, t) == 0 for effect in element.effects):
+            yield element
+        elif isinstance(element, Container):
+            for curve in iterate_drawn_curves(element.elements, t):
+                yield curve
+        else:
+            yield element
 
 def get_subelements_by_class(alist, subelements, aclass):
-    """ Iteratively searches for all objects of the specified class 'aclass'. 
-    The content of Container objects are also searched.
+    """ Returns all objects of the specified class 'aclass' found in 'alist' or in 'subelements'.
+    The content of Container objects are also searched, through their index.
     Removes duplicates. """
-    if alist == []:
-        return subelements
-    else:
-        new_subelements = subelements \
-                          + [element for element in alist if isinstance(element, aclass)]
-        new_alist = [elt
-                     for element in alist
-                     if isinstance(element, Container)
-                     for elt in element.elements]
-                     
-        return list(set(get_subelements_by_class(new_alist, new_subelements, aclass)))
+    result = SubelementIndex()
+    for element in subelements:
+        result.add(element)
+    for element in alist:
+        if isinstance(element, aclass):
+            result.add(element)
+        if isinstance(element, Container):
+            for subelement in element.subelements.get(aclass):
+                result.add(subelement)
+    return result.get(aclass)
+
+
+class SubelementIndex(object):
+    """ Set of graphics grouped by class, in order of insertion.
+    Querying the objects of a given class costs time proportional to the size of the result
+    (plus the number of distinct classes).
+    """
+    __slots__ = ('members', 'by_class')
+
+    def __init__(self):
+        self.members = set()
+        self.by_class = {}
+
+    def __contains__(self, element):
+        return element in self.members
+
+    def __len__(self):
+        return len(self.members)
+
+    def add(self, element):
+        if element in self.members:
+            return False
+        self.members.add(element)
+        self.by_class.setdefault(type(element), []).append(element)
+        return True
+
+    def get(self, aclass):
+        return [element
+                for element_class, elements in self.by_class.items()
+                if issubclass(element_class, aclass)
+                for element in elements]
 
 
 class PostponeCurveTimeUpdatingToEnd(object):
@@ -58,7 +112,7 @@ class PostponeCurveTimeUpdatingToEnd(object):
         self.curves_with_old_times = {}
         if self.container.external_call == False:
             self.curves_with_old_times = dict({curve: tuple(curve.epochs.values())
-                                               for curve in get_subelements_by_class(self.container.elements, [], Curve)})
+                                               for curve in self.container.subelements.get(Curve)})
         
     def __enter__(self):
         pass
@@ -68,6 +122,10 @@ class PostponeCurveTimeUpdatingToEnd(object):
             for curve in self.curves_with_old_times.keys():
                 curve_old_times = self.curves_with_old_times[curve]
                 curve_new_times = curve.epochs.values()
+                if Batch.active():
+                    Batch.record_old_times(curve, curve_old_times)
+                    curve.update_epochs()
+                    continue
                 for effect in curve.effects:
                     dt = effect.lifespan()
                     if effect.stage == 'intro':
@@ -82,9 +140,11 @@ class PostponeCurveTimeUpdatingToEnd(object):
                                                             curve_new_times[1]), curve_new_times[0])
                         effect.epochs['begin time'] = max(min(curve_new_times[1] + dt_end - dt, \
                                                               curve_new_times[1]), curve_new_times[0])
+                for master in curve.masters:
+                    master.update_element_effects(curve, curve_old_times)
                 curve.update_epochs()
 
-            for graphic in get_subelements_by_class(self.container.elements, [], Graphic):
+            for graphic in self.container.subelements.get(Graphic):
                 graphic.external_call = False
 
 
@@ -113,6 +173,9 @@ class Container(Graphic):
     - anchor
     - cardinals
     - elements
+    - subelements
+    - standalone_index
+    - element_epochs
     """
     def __init__(self, *elements):
         Graphic.__init__(self)
@@ -123,9 +186,34 @@ class Container(Graphic):
 
     def  initialize_elements(self, *elements):
         self.elements = []
+        self.subelements = SubelementIndex()
+        self.standalone_index = SubelementIndex()
+        self.element_epochs = {}
         for element in elements:
             self.add_element(element)
 
+    def  index_element(self, element):
+        """ Records 'element' (and its own subelements) in the index of self and of all its masters. """
+        subelements = [element]
+        if isinstance(element, Container):
+            subelements += element.subelements.get(Graphic)
+        if isinstance(element, Compound):
+            standalones = element.standalone_index.get(Graphic)
+        else:
+            standalones = [element]
+        self.index_subelements(subelements, standalones)
+
+    def  index_subelements(self, subelements, standalones):
+        subelements = [element for element in subelements if self.subelements.add(element)]
+        standalones = [element for element in standalones if self.standalone_index.add(element)]
+        if not isinstance(self, Compound):
+            standalones = []
+        if subelements == [] and standalones == []:
+            return
+        for master in self.masters:
+            if isinstance(master, Container):
+                master.index_subelements(subelements, standalones)
+
 
     # -------------------- BASIC METHODS --------------------
 
@@ -146,23 +234,56 @@ class Container(Graphic):
             element.set_brush_color(brush_color)
             
     def standalones(self):
-        return extract_standalones(self.elements, [])
+        return self.standalone_index.get(Graphic)
 
     def get_blocks(self):
-        return get_subelements_by_class(self.elements, [], Block)
+        return self.subelements.get(Block)
 
     def update_epochs(self):
         if self.elements == []:
             print("WARNING."),
             print("Object %s of class '%s' contains no element." % (self.name, self.__class__.__name__)),
             print("Set epochs to default value.")
-            self.epochs = dict(DEFAULT_EPOCHS)
+            self.epochs = Epochs()
+            return
+        self.element_epochs = {element: (element.epochs['begin time'], element.epochs['end time'])
+                               for element in self.elements}
+        self.epochs['begin time'] = min([times[0] for times in self.element_epochs.values()])
+        self.epochs['end time'] = max([times[1] for times in self.element_epochs.values()])
+        Graphic.update_epochs(self)
+
+    def update_element_epochs(self, element):
+        """ Updates the epochs of self after those of 'element' have changed.
+        The epochs of the other elements are only read again
+        if the epoch of 'element' which defined the begin or end time of self has shrunk.
+        """
+        if not element in self.element_epochs:
+            # e.g. the base line of a TexObject, which has the TexObject as master without being an element.
+            return
+        old_times = self.element_epochs[element]
+        new_times = element.epochs['begin time'], element.epochs['end time']
+        self.element_epochs[element] = new_times
+        begin_time, end_time = self.epochs['begin time'], self.epochs['end time']
+        if old_times == None and len(self.element_epochs) == 1:
+            begin_time, end_time = new_times
+        elif old_times != None \
+             and ((old_times[0] == begin_time and new_times[0] > begin_time) \
+                  or (old_times[1] == end_time and new_times[1] < end_time)):
+            begin_time = min([times[0] for times in self.element_epochs.values()])
+            end_time = max([times[1] for times in self.element_epochs.values()])
+        else:
+            begin_time = min(begin_time, new_times[0])
+            end_time = max(end_time, new_times[1])
+        if (begin_time, end_time) == (self.epochs['begin time'], self.epochs['end time']):
             return
-        subelements = get_subelements_by_class(self.elements, [], Graphic)
-        self.epochs['begin time'] = min([element.epochs['begin time'] for element in subelements])
-        self.epochs['end time'] = max([element.epochs['end time'] for element in subelements])
+        self.epochs['begin time'] = begin_time
+        self.epochs['end time'] = end_time
         Graphic.update_epochs(self)
 
+    def update_element_effects(self, element, old_times):
+        """ Called when the epochs of the curve 'element' have changed from 'old_times'. """
+        pass
+
     def add_element(self, element):
         if not element.masters == []:
             if isinstance(element.masters[0], Animation):
@@ -185,34 +306,104 @@ class Container(Graphic):
             print("Cannot add Effect object (id %s) to Compound (id %s)."%(id(element), id(self)))
             return 
 
-        if isinstance(element, Container):
-            containers = get_subelements_by_class(element.elements, [], Container)
-        else:
-            containers = []
-
         # This is to avoid infinite loops when calling update_epochs method.
-        for elt in containers:
-            if (self is elt):
-                print("WARNING."),
-                print("Cannot add to elements of self"),
-                print("a container which contains self among subelements.")
-                return
-            else:
-                pass
+        if isinstance(element, Container) and self in element.subelements:
+            print("WARNING."),
+            print("Cannot add to elements of self"),
+            print("a container which contains self among subelements.")
+            return
 
         element.masters.append(self)
         self.elements.append(element)
-        self.update_epochs()
+        self.index_element(element)
+        self.element_epochs[element] = None
+        self.update_element_epochs(element)
         Container.update_cardinals(self)
 
+    # -------------------- SYNCHRONIZATION METHODS --------------------
+    # Within a batch, the epochs of the elements are propagated to the containers before their epochs are read.
+    def get_epochs(self):
+        if Batch.graphics_with_new_epochs:
+            Batch.propagate_epochs()
+        return Primitive.epochs.__get__(self)
+
+    def set_epochs(self, epochs):
+        Primitive.epochs.__set__(self, epochs)
+
+    epochs = property(get_epochs, set_epochs)
+
     # -------------------- GEOMETRIC METHODS --------------------
+    # The bounding box (anchor and cardinals) is recomputed lazily, on first read after a change.
+    cardinals_dirty = False
+
+    def get_anchor(self):
+        if Transforms.pending:
+            Transforms.flush()
+        self.refresh_cardinals()
+        return Graphic.get_anchor(self)
+
+    def set_anchor(self, anchor):
+        if Transforms.pending:
+            Transforms.flush()
+        self.refresh_cardinals()
+        Graphic.set_anchor(self, anchor)
+
+    def get_cardinals(self):
+        if Transforms.pending:
+            Transforms.flush()
+        self.refresh_cardinals()
+        return Graphic.get_cardinals(self)
+
+    def set_cardinals(self, cardinals):
+        if Transforms.pending:
+            Transforms.flush()
+        self.refresh_cardinals()
+        Graphic.set_cardinals(self, cardinals)
+
+    anchor = property(get_anchor, set_anchor)
+    cardinals = property(get_cardinals, set_cardinals)
+
     def update_cardinals(self):
+        """ Marks the bounding box as out of date, as well as those of the masters. """
+        if self.cardinals_dirty:
+            return
+        self.cardinals_dirty = True
+        Graphic.update_cardinals(self)
+
+    # The transforms (translation, homothety, rotation) of a container are composed in constant time,
+    # and only passed down to the elements when their geometry is needed (see Transforms in graphic.py).
+    pending_transform = None
+
+    def apply_transform(self, M):
+        """ Applies the affine transformation 'M' (a (3, 3)-matrix) to self and its elements. """
+        if len(Transforms.pending) > 1 or (Transforms.pending and not self in Transforms.pending):
+            Transforms.flush()
+        self.transform_geometry(M)
+
+    def transform_geometry(self, M):
+        if self.pending_transform is None:
+            self.pending_transform = M
+        else:
+            self.pending_transform = np.dot(M, self.pending_transform)
+        Transforms.register(self)
+        self.update_cardinals()
+
+    def push_transform(self):
+        M = self.pending_transform
+        self.pending_transform = None
+        for element in self.elements:
+            element.transform_geometry(M)
+            element.update_cardinals()
+
+    def refresh_cardinals(self):
+        if not self.cardinals_dirty:
+            return
+        self.cardinals_dirty = False
         aux = flatten(tuple(element.corners() for element in self.elements))
         self.cardinals = get_cardinals(aux)
         for key in self.cardinals.keys():
             self.cardinals[key] = translate(self.cardinals[key], scale(-1, self.anchor))
         self.change_anchor_to(self.nw())
-        Graphic.update_cardinals(self)
 
 
 
@@ -220,7 +411,7 @@ class Container(Graphic):
     # -------------------- SYNCHRONIZATION METHODS --------------------
     def delay(self, delay):
         with PostponeCurveTimeUpdatingToEnd(self):
-            for curve in get_subelements_by_class(self.elements, [], Curve):
+            for curve in self.subelements.get(Curve):
                 delay = Primitive.delay(curve, delay)                
         return delay
 
@@ -282,6 +473,7 @@ class Container(Graphic):
 class Compound(Container):
 
     def add_effects(self, *effects):
+        effects = [effect.share() for effect in effects]
         for element in self.elements:
             element.add_effects(*effects)
 
@@ -289,22 +481,26 @@ class Compound(Container):
     def sketch(self, root, cvsketch, ratio):
         Container.sketch(self, root, cvsketch, ratio, color = 'green')
 
+    # -------------------- DRAWING METHODS --------------------
+    def draw(self, canvas, *t):
+        """ On a RasterCanvas, draws the avatars of the curves, including those of the Block and Compound objects
+        among the elements, as a single sprite if they are a translated copy of the curves (see 'draw_rigid').
+        """
+        if isinstance(canvas, RasterCanvas) and not len(t) == 0 \
+           and draw_rigid(canvas, iterate_drawn_curves(self.elements, t[0]), t[0]):
+            return
+        Container.draw(self, canvas, *t)
+
     # -------------------- GEOMETRIC METHODS --------------------
 
     def translate(self, v):
-        with PostponeCurveGeometricUpdatingToEnd(self):
-            for element in self.elements:
-                element.translate(v)
+        self.apply_transform(translation_matrix(v))
 
     def homothety(self, center, sx, sy):
-        with PostponeCurveGeometricUpdatingToEnd(self):
-            for element in self.elements:
-                element.homothety(center, sx, sy)
+        self.apply_transform(homothety_matrix(center, sx, sy))
 
     def rotate(self, center, angle):
-        with PostponeCurveGeometricUpdatingToEnd(self):
-            for element in self.elements:
-                element.rotate(center, angle)
+        self.apply_transform(rotation_matrix(center, angle))
 
     def move_to(self, p):
         with PostponeCurveGeometricUpdatingToEnd(self):
@@ -359,6 +555,28 @@ class Compound(Container):
 
 # ==================== BLOCK =========================
 class Block(Container):
+    """ Attributes:
+    - name
+    - masters
+    - epochs
+    - external_call
+    - anchor
+    - cardinals
+    - elements
+    - subelements
+    - standalone_index
+    - element_epochs
+    - effects: distributive effects held by the block (see add_distributed_effect)
+    """
+    def  initialize_elements(self, *elements):
+        self.effects = []
+        Container.initialize_elements(self, *elements)
+
+    def add_element(self, element):
+        # The bounding box of a block is that of its elements when they are added,
+        # afterwards it only follows the transforms of the block itself.
+        Container.add_element(self, element)
+        self.refresh_cardinals()
 
     def add_effects(self, *effects):
         for effect in effects:
@@ -367,6 +585,7 @@ class Block(Container):
                or isinstance(effect, Sunrise) \
                or isinstance(effect, Zoom) \
                or isinstance(effect, Trace):
+                effect = effect.share()
                 for element in self.elements:
                     element.add_effects(effect)
             elif isinstance(effect, Travel):
@@ -376,7 +595,7 @@ class Block(Container):
                                                stage = effect.stage,
                                                center = center,
                                                duration = effect.lifespan(),
-                    ))
+                    ).freeze())
             elif isinstance(effect, Wring):
                 if not isinstance(self, TexObject):
                     print("WARNING."),
@@ -386,14 +605,15 @@ class Block(Container):
                     center = effect.center
                     c = (0.5*self.width()*center[0], -self.base_to_waist*center[1])
                     c = translate(c, self.base_center())
+                    wring = Wring(\
+                                  stage = effect.stage,
+                                  center = c,
+                                  amplitude = effect.amplitude,
+                                  pace = effect.pace,
+                                  duration = effect.lifespan(),
+                    ).freeze()
                     for element in self.elements:
-                        element.add_effects(Wring(\
-                                                  stage = effect.stage,
-                                                  center = c,
-                                                  amplitude = effect.amplitude,
-                                                  pace = effect.pace,
-                                                  duration = effect.lifespan(),
-                        ))
+                        element.add_effects(wring)
             elif isinstance(effect, Trickle):
                 N = len(self.elements)
                 #
@@ -403,20 +623,16 @@ class Block(Container):
                 elif effect.order == 'random':
                     random.shuffle(ordering)
                 #
+                dt = effect.lifespan()/8 # or divide by 2, 4, ...?
+                DT = effect.lifespan() - dt
+                times = []
                 for i in range(N):
-                    element = self.elements[i]
-                    dt = effect.lifespan()/8 # or divide by 2, 4, ...?
-                    DT = effect.lifespan() - dt
-                    center = translate(element.anchor, effect.separation)
-                    elt_eff = Travel(\
-                                     stage = effect.stage,
-                                     center = center,
-                                     pace = 'soft landing',
-                                     )
-                    elt_eff.set_times((effect.begin() + ordering[i]*DT/N, effect.begin() + ordering[i]*DT/N + dt))
+                    begin_time = effect.begin() + ordering[i]*DT/N
                     if effect.stage == 'outro':
-                        elt_eff.delay(-effect.lifespan())                    
-                    element.add_effects(elt_eff)
+                        begin_time -= effect.lifespan()
+                    times.append((begin_time, begin_time + dt))
+                centers = [translate(element.anchor, effect.separation) for element in self.elements]
+                self.add_distributed_effect(Travel(stage = effect.stage, pace = 'soft landing'), times, centers)
             elif isinstance(effect, Reveal):
                 N = len(self.elements)
                 if effect.ordering == None:
@@ -427,18 +643,15 @@ class Block(Container):
                         random.shuffle(ordering)
                 else:
                     ordering = effect.ordering
+                dt = effect.lifespan()/4
+                DT = effect.lifespan() - dt
+                times = []
                 for i in range(N):
-                    element = self.elements[i]
-                    dt = effect.lifespan()/4
-                    DT = effect.lifespan() - dt
-                    elt_eff = Fade(\
-                                   stage = effect.stage,
-                                   tools = effect.tools,
-                    )
-                    elt_eff.set_times((effect.begin() + ordering[i]*DT/N, effect.begin() + ordering[i]*DT/N + dt))
+                    begin_time = effect.begin() + ordering[i]*DT/N
                     if effect.stage == 'outro':
-                        elt_eff.delay(-effect.lifespan())                    
-                    element.add_effects(elt_eff)
+                        begin_time -= effect.lifespan()
+                    times.append((begin_time, begin_time + dt))
+                self.add_distributed_effect(Fade(stage = effect.stage, tools = effect.tools), times)
             elif isinstance(effect, ThreeBlueOneBrown):
                 N = len(self.elements)
                 #
@@ -475,6 +688,36 @@ class Block(Container):
                 print("WARNING"),
                 print("Effect '%s' not yet supported."%effect.__class__.__name__)
 
+    def add_distributed_effect(self, definition, times, centers = None):
+        """ Applies the effect 'definition' to each element,
+        with the epochs times[i] (and for Travel the center centers[i]) for the i-th element.
+        The curves share a single DistributedEffect held by self,
+        the other elements (if any) receive their own copy of the effect.
+        """
+        curves, curve_times, curve_centers = [], [], []
+        for i in range(len(self.elements)):
+            element = self.elements[i]
+            if isinstance(element, Curve):
+                curves.append(element)
+                curve_times.append(times[i])
+                if not centers == None:
+                    curve_centers.append(centers[i])
+            else:
+                element_effect = definition.thaw()
+                element_effect.set_times(times[i])
+                if not centers == None:
+                    element_effect.center = centers[i]
+                element.add_effects(element_effect.freeze())
+        if curves == []:
+            return
+        if centers == None:
+            curve_centers = None
+        self.effects.append(DistributedEffect(definition.freeze(), self, curves, curve_times, curve_centers))
+
+    def update_element_effects(self, element, old_times):
+        for effect in self.effects:
+            effect.update_element_epochs(element, old_times)
+
                 
 
                     
@@ -482,27 +725,69 @@ class Block(Container):
     def sketch(self, root, cvsketch, ratio):
         Container.sketch(self, root, cvsketch, ratio, color = 'red')
 
+    # -------------------- DRAWING METHODS --------------------
+    def draw(self, canvas, *t):
+        """ Draws the curves (or their avatars) in their order, consecutive curves with the same drawing kit
+        as a single aggdraw path when they do not overlap (see 'draw_batch').
+        The effects held by self are applied to the avatars after those of the curves.
+        On a RasterCanvas, the avatars whose shape is that of their curve (e.g. under Fade or Travel,
+        but not Zoom, Spin, Wring or Trace) are pasted as sprites instead (see 'draw_sprites'),
+        or all together as a single sprite if they are a translated copy of the curves
+        and the effects held by self are over (see 'draw_rigid').
+        """
+        raster = isinstance(canvas, RasterCanvas)
+        settled = not len(t) == 0 and all(effect.initial_filter(None, None, t[0]) == 0 for effect in self.effects)
+        if raster and settled and draw_rigid(canvas, iterate_drawn_curves(self.elements, t[0]), t[0]):
+            return
+        if settled:
+            # The avatars are not modified by the effects held by self.
+            avatars = [element.get_drawn_avatar(t[0]) if isinstance(element, Curve) else None
+                       for element in self.elements]
+        else:
+            avatars = [element.get_avatar(*t) if isinstance(element, Curve) else None
+                       for element in self.elements]
+            if not len(t) == 0:
+                for effect in self.effects:
+                    effect.apply_to_avatars(self.elements, avatars, t[0])
+        # The elements are drawn in their order, by runs of consecutive elements drawn in the same way.
+        items = []
+        for element, avatar in zip(self.elements, avatars):
+            if not isinstance(element, Curve):
+                items.append(('element', element))
+            elif avatar == None:
+                pass
+            elif raster and avatar.decoration == [] \
+                 and avatar.coords is element.coords and avatar.commands is element.commands:
+                items.append(('sprite', avatar))
+            else:
+                items.append(('path', avatar))
+        for mode, run in itertools.groupby(items, key = lambda item: item[0]):
+            graphics = [graphic for mode, graphic in run]
+            if mode == 'sprite':
+                draw_sprites(canvas, graphics)
+            elif mode == 'path':
+                draw_batch(canvas, graphics)
+            else:
+                for element in graphics:
+                    element.draw(canvas, *t)
+
     # -------------------- GEOMETRIC METHODS --------------------
     def update_cardinals(self):
         Graphic.update_cardinals(self)
     
+    def push_transform(self):
+        self.refresh_cardinals()
+        Graphic.transform_geometry(self, self.pending_transform)
+        Container.push_transform(self)
+
     def translate(self,v):
-        with PostponeCurveGeometricUpdatingToEnd(self):
-            Graphic.translate(self, v)
-            for element in self.elements:
-                element.translate(v)
+        self.apply_transform(translation_matrix(v))
 
     def homothety(self, center, sx, sy):
-        with PostponeCurveGeometricUpdatingToEnd(self):
-            Graphic.homothety(self, center, sx, sy)
-            for element in self.elements:
-                element.homothety(center, sx, sy)
+        self.apply_transform(homothety_matrix(center, sx, sy))
 
     def rotate(self, center, angle):
-        with PostponeCurveGeometricUpdatingToEnd(self):
-            Graphic.rotate(self, center, angle)
-            for element in self.elements:
-                element.rotate(center, angle)
+        self.apply_transform(rotation_matrix(center, angle))
 
     def move_to(self, p):
         with PostponeCurveGeometricUpdatingToEnd(self):
@@ -561,35 +846,74 @@ class Block(Container):
 
 
 # ---------------------------------------- SVG ----------------------------------------
-def get_svg_elements(file_name):
-
-    doc = minidom.parse(file_name)
-    x_min = float(doc.getElementsByTagName("svg")[0].getAttribute('viewBox').split()[0])
-    y_min = float(doc.getElementsByTagName("svg")[0].getAttribute('viewBox').split()[1])
-
-    D = {}
-    path_elements = doc.getElementsByTagName('path')
-    for path_element in path_elements:
-        D[path_element.getAttribute('id')] = path_element.getAttribute('d')
-
-    use_elements = doc.getElementsByTagName('use')
-    L = len(use_elements)
-
+SVG_NAMESPACE = '{http://www.w3.org/2000/svg}'
+XLINK_HREF = '{http://www.w3.org/1999/xlink}href'
+
+# Version of the format of the geometry returned by 'read_svg_geometry' (and stored by 'get_tex_geometry').
+SVG_GEOMETRY_VERSION = 2
+
+def read_svg_geometry(file_name):
+    """ Returns the geometry of the .svg file 'file_name' (in the format produced by dvisvgm) as a dictionary:
+    - 'version': SVG_GEOMETRY_VERSION,
+    - 'size': width and height of the picture,
+    - 'paths': path data ('d' attribute) of the glyphs, by id,
+    - 'glyphs': list of the anchor and path id of each glyph,
+    - 'rule': vertical position (relative to the top) and height of the rule (rect element), or None.
+    The values are plain tuples and strings, so that the geometry can be stored with 'pickle'.
+    The file is read in a single pass, without building its document tree.
+    """
+    paths = {}
+    glyphs = []
+    rule = None
+    for event, element in ElementTree.iterparse(file_name, events = ('start', 'end')):
+        tag = element.tag.replace(SVG_NAMESPACE, '')
+        if event == 'start':
+            if tag == 'svg':
+                x_min, y_min = [float(value) for value in element.get('viewBox').split()[:2]]
+                w = float(element.get('width').replace('pt',''))
+                h = float(element.get('height').replace('pt',''))
+            continue
+        if tag == 'path':
+            paths[element.get('id')] = element.get('d')
+        elif tag == 'use':
+            glyphs.append(((float(element.get('x')) - x_min, float(element.get('y')) - y_min), element.get(XLINK_HREF)[1:]))
+        elif tag == 'rect' and rule == None:
+            rule = float(element.get('y')) - y_min, float(element.get('height'))
+        else:
+            continue
+        element.clear()
+
+    return {'version': SVG_GEOMETRY_VERSION, 'size': (w, h), 'paths': paths, 'glyphs': glyphs, 'rule': rule}
+
+# Coordinates, commands and cardinals of the glyph paths read so far, by path data:
+# the curves of a glyph used several times, in one or several .svg files, share the same coordinates
+# (also once transformed in the same way, see 'Curve.apply_linear').
+GLYPH_PATHS = {}
+
+def get_glyph_path(d):
+    """ Returns the coordinates, commands and cardinals of the path data 'd' (see 'd_to_coords_and_commands'). """
+    if not d in GLYPH_PATHS:
+        coords, commands = d_to_coords_and_commands(d)
+        GLYPH_PATHS[d] = coords, str(commands), get_cardinals(coords)
+    return GLYPH_PATHS[d]
+
+def get_svg_elements(file_name, geometry = None):
+    """ Returns the cardinals of the picture and the list of glyphs (as Curve objects) of the .svg file 'file_name',
+    or of 'geometry' if specified (see 'read_svg_geometry').
+    """
+    if geometry == None:
+        geometry = read_svg_geometry(file_name)
+    paths = geometry['paths']
     elements = []
-    for use_element in use_elements:
-        dx = float(use_element.getAttribute('x')) - x_min
-        dy = float(use_element.getAttribute('y')) - y_min
-        anchor = dx, dy
-
-        id = use_element.getAttribute('xlink:href')[1:]
-        coords, commands = d_to_coords_and_commands(D[id])
+    for anchor, id in geometry['glyphs']:
+        coords, commands, cardinals = get_glyph_path(paths[id])
         elements.append(Curve(
             anchor = anchor,
             coords = coords,
-            commands = commands))
+            commands = commands,
+            cardinals = cardinals))
 
-    w = float(doc.getElementsByTagName("svg")[0].getAttribute('width').replace('pt',''))
-    h = float(doc.getElementsByTagName("svg")[0].getAttribute('height').replace('pt',''))
+    w, h = geometry['size']
     nw_corner = 0, 0
     sw_corner = 0, h
     se_corner = w, h
@@ -598,46 +922,109 @@ def get_svg_elements(file_name):
     xy = points_to_tuple(nw_corner, sw_corner, se_corner, ne_corner)
     return get_cardinals(xy), elements
 
+# Geometries of the compiled expressions, by key (see 'get_tex_key').
+TEX_GEOMETRIES = {}
 
-def d_to_coords_and_commands(string):
-    """Takes:
-        string = the 'd' attribute of a path element from an .svg file
-    and returns tuple 'commands, coords' where:
-        1) commands =  a string containing the commands ('M', 'L', 'C', 'S', 'Q', 'Z') where 'H' and 'V' commands have been converted to 'L' commands;
-        2) coords = a list of coordinates of the control points (in float format).
+def get_tex_geometry(expression):
+    """ Returns the geometry (see 'read_svg_geometry') of the LaTeX expression 'expression'.
+    Compiled expressions are cached on disk in TEX_DIR_PATH (.svg file, and its geometry in a .geometry file)
+    under a key depending on the expression, the LaTeX template and the versions of latex and dvisvgm:
+    LaTeX only runs for new or modified expressions.
     """
-    aux = string
-    i = len(string)-1
-    while i>0:
-        if string[i] in  'MLHVCSQZ':
-            aux = aux[:i]+'|'+aux[i:]
-        elif string[i] in 'TAmlhvcsqzta':
-            print("Warning: command '%s' not supported!" % string[i])
-        else:
+    key = get_tex_key(expression)
+    if key in TEX_GEOMETRIES:
+        return TEX_GEOMETRIES[key]
+    geometry_file_name = os.path.join(TEX_DIR_PATH, key + '.geometry')
+    geometry = None
+    if os.path.exists(geometry_file_name):
+        try:
+            with open(geometry_file_name, 'rb') as infile:
+                geometry = pickle.load(infile)
+        except Exception:
+            print("WARNING."),
+            print("Could not read cached geometry '%s', will compile expression again." % geometry_file_name)
+        if not geometry == None and not geometry.get('version') == SVG_GEOMETRY_VERSION:
+            geometry = None
+    if geometry == None:
+        svg_file_name = os.path.join(TEX_DIR_PATH, key + '.svg')
+        if not os.path.exists(svg_file_name):
+            svg_file_name = dvi_to_svg(tex_to_dvi(generate_tex_file(expression)))
+        geometry = read_svg_geometry(svg_file_name)
+        with open(geometry_file_name, 'wb') as outfile:
+            pickle.dump(geometry, outfile, pickle.HIGHEST_PROTOCOL)
+    TEX_GEOMETRIES[key] = geometry
+    return geometry
+
+class TexHandle(object):
+    """ Handle on the compilation of an expression by the LaTeX workers (see 'submit_tex_expression').
+    Attributes:
+    - expression
+    - done: event set when the compilation is over
+    - geometry: the geometry of the expression (see 'get_tex_geometry')
+    - error: the exception raised by the compilation, if any
+    """
+    def __init__(self, expression):
+        self.expression = expression
+        self.done = threading.Event()
+        self.geometry = None
+        self.error = None
+
+    def get(self):
+        """ Waits for the compilation and returns the geometry. """
+        self.done.wait()
+        if not self.error == None:
+            raise self.error
+        return self.geometry
+
+# Expressions waiting to be compiled (their handles), LaTeX workers (threads, latex and dvisvgm running in their own
+# processes) and handles on the compilations, by key.
+TEX_QUEUE = queue.Queue()
+TEX_WORKERS = []
+TEX_HANDLES = {}
+
+def run_tex_worker():
+    """ Compiles the expressions put in TEX_QUEUE, as long as the program runs.
+    All the expressions waiting when a worker is free are compiled together, with a single run of latex and dvisvgm
+    (see 'compile_tex_batch'), so that each of them only costs the shipout of a page.
+    """
+    while True:
+        handles = [TEX_QUEUE.get()]
+        try:
+            while True:
+                handles.append(TEX_QUEUE.get_nowait())
+        except queue.Empty:
             pass
-        i -= 1
-    aux = aux.split('|')
-    for i in range(len(aux)):
-        aux[i] = [aux[i][0], aux[i][1:]]
-        aux[i][1] = aux[i][1].split()
-    for i in range(0,len(aux)):
-        if aux[i][0][0] == 'Z':
-            x,y = [None,None] # But don't assign these inside aux!  Just for monitoring...
-        elif aux[i][0][0] == 'H':
-            x = aux[i][1][0]
-            aux[i][1] = [x,y]
-            aux[i][0] = 'L'
-        elif aux[i][0][0] == 'V':
-            y = aux[i][1][0]
-            aux[i][1] = [x,y]
-            aux[i][0] = 'L'
-        else:
-            x,y = aux[i][1][-2:]
-    commands = [item[0] for item in aux]
-    commands = ''.join(commands)
-    coords = [item[1] for item in aux]
-    coords = tuple(float(coord) for item in coords for coord in item)
-    return coords, commands
+        try:
+            compile_tex_batch([handle.expression for handle in handles])
+        except Exception as error:
+            print("WARNING."),
+            print("LaTeX batch failed (%s), expressions will be compiled one by one." % error)
+        for handle in handles:
+            try:
+                handle.geometry = get_tex_geometry(handle.expression)
+            except Exception as error:
+                handle.error = error
+            handle.done.set()
+
+def submit_tex_expression(expression):
+    """ Starts compiling 'expression' in the background (see 'run_tex_worker'),
+    returns a handle whose method 'get' waits for the compilation and returns the geometry.
+    Expressions submitted several times are compiled only once.
+    """
+    key = get_tex_key(expression)
+    if not key in TEX_HANDLES:
+        if TEX_WORKERS == []:
+            make_tex_dir()
+            get_tex_format()
+            get_tex_format(batch = True)
+            for i in range(cpu_count()):
+                worker = threading.Thread(target = run_tex_worker)
+                worker.daemon = True
+                worker.start()
+                TEX_WORKERS.append(worker)
+        TEX_HANDLES[key] = TexHandle(expression)
+        TEX_QUEUE.put(TEX_HANDLES[key])
+    return TEX_HANDLES[key]
 
 # --------------------------------------- SVGOBJECT -------------------------------------------------------------
 class SVGObject(Block):
@@ -650,12 +1037,16 @@ class SVGObject(Block):
     - cardinals
     - elements
     """
-    def __init__(self, file_name):
+    def __init__(self, file_name, geometry = None):
         Primitive.__init__(self)
-        self.anchor = ORIGIN
-        self.cardinals, self.elements = get_svg_elements(file_name)
-        for element in self.elements:
+        self.linear = None
+        self.stored_anchor = ORIGIN
+        self.stored_cardinals, elements = get_svg_elements(file_name, geometry)
+        self.initialize_elements()
+        for element in elements:
             element.masters.append(self)
+            self.elements.append(element)
+            self.index_element(element)
         self.external_call = False
         self.update_epochs()
 
@@ -671,20 +1062,61 @@ class TexObject(SVGObject):
     - anchor
     - cardinals
     - elements
+    - expression
+    - tex_handle: handle on the compilation of the expression (see 'submit_tex_expression'),
+      until self is initialized
     """
     def __init__(self, expression):
-        tex_file_name = generate_tex_file(expression)
-        dvi_file_name = tex_to_dvi(tex_file_name)
-        svg_file_name = dvi_to_svg(dvi_file_name)
-
+        # The expression is compiled in the background,
+        # and self is only initialized when one of its attributes is first needed (see '__getattr__').
+        self.expression = expression
+        self.tex_handle = submit_tex_expression(expression)
+
+    def __getattr__(self, name):
+        # Only called for attributes not found, i.e. before initialization (or for missing attributes).
+        if not 'tex_handle' in self.__dict__:
+            raise AttributeError(name)
+        self.complete_initialization()
+        return getattr(self, name)
+
+    def complete_initialization(self):
+        if 'tex_handle' in self.__dict__:
+            self.initialize(self.__dict__.pop('tex_handle').get())
+
+    def initialize(self, geometry):
+        # The attributes set before initialization (e.g. the name given by 'record_name') are kept.
+        kept = dict(self.__dict__)
+        for aclass in type(self).__mro__:
+            for name in aclass.__dict__.get('__slots__', ()):
+                try:
+                    kept[name] = object.__getattribute__(self, name)
+                except AttributeError:
+                    pass
         SVGObject.__init__(
             self,
-            file_name = svg_file_name)
-        self.base_to_waist = self.set_base_to_waist(svg_file_name)
-        self.add_base_and_waist_cardinals(svg_file_name)
-        self.homothety(self.anchor, NORMAL_TEXT_SCALE, NORMAL_TEXT_SCALE)
+            file_name = None,
+            geometry = geometry)
+        self.base_to_waist = self.set_base_to_waist(geometry)
+        self.add_base_and_waist_cardinals(geometry)
+        # The scale is only composed with the pending transform of self (see 'Container.apply_transform'):
+        # the glyphs are transformed when their geometry is read, typically after further rescaling.
+        # A new TexObject shares no element with other objects, so other pending transforms need not be applied first.
+        self.transform_geometry(homothety_matrix(ORIGIN, NORMAL_TEXT_SCALE, NORMAL_TEXT_SCALE))
         self.set_drawing_kit(DEFAULT_DRAWING_KIT)
+        # The transform and the bounding box are those computed above.
+        for name in ('pending_transform', 'cardinals_dirty'):
+            kept.pop(name, None)
+        for name, value in kept.items():
+            setattr(self, name, value)
+
+    # A transform reads the elements and registers self in Transforms: self is initialized first.
+    def apply_transform(self, M):
+        self.complete_initialization()
+        SVGObject.apply_transform(self, M)
 
+    def transform_geometry(self, M):
+        self.complete_initialization()
+        SVGObject.transform_geometry(self, M)
 
 
     def base_left(self):
@@ -729,28 +1161,31 @@ class TexObject(SVGObject):
         result.set_drawing_kit({'pen color': BLUE, 'pen width': 2, 'brush color': None})
         return result
 
-    def set_base_to_waist(self, svgfilename):
-        doc = minidom.parse(svgfilename)
-        w = float(doc.getElementsByTagName("svg")[0].getAttribute('width').replace('pt',''))
-        y_min = float(doc.getElementsByTagName("svg")[0].getAttribute('viewBox').split()[1])
-        
-        return float(doc.getElementsByTagName('rect')[0].getAttribute('height'))
+    def set_base_to_waist(self, geometry):
+        return geometry['rule'][1]
 
 
-    def add_base_and_waist_cardinals(self, svgfilename):
-        doc = minidom.parse(svgfilename)
-        w = float(doc.getElementsByTagName("svg")[0].getAttribute('width').replace('pt',''))
-        y_min = float(doc.getElementsByTagName("svg")[0].getAttribute('viewBox').split()[1])
-        
-        h = float(doc.getElementsByTagName('rect')[0].getAttribute('height'))
-        dy = float(doc.getElementsByTagName('rect')[0].getAttribute('y')) - y_min
+    def add_base_and_waist_cardinals(self, geometry):
+        w = geometry['size'][0]
+        dy, h = geometry['rule']
 
-        self.cardinals['wl'] = 0, dy
-        self.cardinals['wr'] = w, dy
-        self.cardinals['wc'] = interpolate(self.cardinals['wl'], self.cardinals['wr'], 0.5)
-        self.cardinals['bl'] = 0, dy + h
-        self.cardinals['br'] = w, dy + h
-        self.cardinals['bc'] = interpolate(self.cardinals['bl'], self.cardinals['br'], 0.5)
+        # Called on a new TexObject, whose cardinals are not affected by pending transforms.
+        cardinals = self.stored_cardinals
+        cardinals['wl'] = 0, dy
+        cardinals['wr'] = w, dy
+        cardinals['wc'] = interpolate(cardinals['wl'], cardinals['wr'], 0.5)
+        cardinals['bl'] = 0, dy + h
+        cardinals['br'] = w, dy + h
+        cardinals['bc'] = interpolate(cardinals['bl'], cardinals['br'], 0.5)
+
+
+def make_tex_objects(*expressions):
+    """ Returns the list of TexObjects of the LaTeX expressions 'expressions'.
+    The expressions not compiled yet are compiled together, with a single run of latex and dvisvgm
+    (see 'compile_tex_batch'), which is much faster than one run per TexObject.
+    """
+    compile_tex_batch(expressions)
+    return [TexObject(expression) for expression in expressions]
 
 
 # ------------------------------------------------------------
@@ -775,8 +1210,10 @@ class Animation(Block):
         #
         element.masters.append(self)
         self.elements.append(element)
+        self.index_element(element)
         self.update_epochs()
         Container.update_cardinals(self)
+        self.refresh_cardinals()
 
     def add_effects(self, *effects):
         for effect in effects:
@@ -8,11 +8,14 @@ from constants import *
 from helpers import *
 from geometry import *
 from primitive import Primitive, filter_by_class, fit_within_epochs
-from graphic import Graphic, print_geometry
+from graphic import Graphic, Batch, Transforms, print_geometry
+from effect import BoundEffect, Fade, Travel
 import math
 import inspect
-import copy
+import re
 import aggdraw
+from collections import OrderedDict
+from PIL import Image
 
 def draw(anchor, commands, coords, canvas, pen, brush=None):
     aggdraw_path_string = get_aggdraw_path_string(commands, coords)
@@ -22,71 +25,559 @@ def draw(anchor, commands, coords, canvas, pen, brush=None):
     else:
         canvas.symbol(anchor, symbol, pen, brush)
 
-def get_aggdraw_path_string(commands, coords):
+def get_drawn_box(curve):
+    """ Returns the box (x_min, y_min, x_max, y_max) of the pixels that drawing 'curve' may change. """
+    x, y = curve.anchor
+    margin = curve.drawing_kit['pen width']/2.0 + 1
+    return min(curve.coords[0::2]) + x - margin, min(curve.coords[1::2]) + y - margin, \
+           max(curve.coords[0::2]) + x + margin, max(curve.coords[1::2]) + y + margin
+
+def boxes_overlap(box1, box2):
+    return box1[0] < box2[2] and box2[0] < box1[2] and box1[1] < box2[3] and box2[1] < box1[3]
+
+def draw_path(canvas, drawing_kit, paths):
+    pen, brush = get_pen_and_brush(dict(zip(DRAWING_KIT_TAGS, drawing_kit)))
+    symbol = aggdraw.Symbol(' '.join(paths))
+    if brush == None:
+        canvas.symbol(ORIGIN, symbol, pen)
+    else:
+        canvas.symbol(ORIGIN, symbol, pen, brush)
+
+def get_runs(curves):
+    """ Returns the list of the runs (drawing kit, curves) of consecutive curves with the same drawing kit
+    which do not overlap (see 'get_drawn_box') and which have no decoration, except possibly the last one.
+    Drawn with a single aggdraw path each, the runs are drawn as the curves one after the other:
+    a single path fills all its curves before stroking them, so overlapping curves would not be painted in order.
+    """
+    runs = []
+    boxes = []
+    union = None # box of the current run
+    for curve in curves:
+        drawing_kit = curve.drawing_kit['pen color'], curve.drawing_kit['pen width'], curve.drawing_kit['brush color']
+        box = get_drawn_box(curve)
+        if boxes == [] \
+           or not drawing_kit == runs[-1][0] \
+           or (boxes_overlap(box, union) and any(boxes_overlap(box, other) for other in boxes)):
+            runs.append((drawing_kit, []))
+            boxes = []
+            union = box
+        else:
+            union = min(union[0], box[0]), min(union[1], box[1]), max(union[2], box[2]), max(union[3], box[3])
+        runs[-1][1].append(curve)
+        boxes.append(box)
+        if not curve.decoration == []:
+            boxes = [] # ends the run
+    return runs
+
+def draw_batch(canvas, curves):
+    """ Draws the curves (typically avatars) in their order, with a single aggdraw path for each run
+    of consecutive curves with the same drawing kit which do not overlap (see 'get_runs'),
+    the anchor of each curve being added to its coordinates.
+    The decoration of a curve is drawn right after it.
+    """
+    for drawing_kit, run in get_runs(curves):
+        draw_path(canvas, drawing_kit,
+                  [get_aggdraw_path_string(curve.commands, curve.coords, curve.anchor) for curve in run])
+        run[-1].draw_decoration(canvas)
+
+class RasterCanvas(object):
+    """ Canvas drawing into the image 'img': vector paths are drawn with aggdraw (same methods as aggdraw.Draw),
+    and raster sprites are pasted with PIL (see 'draw_sprites' and 'draw_rigid'), in the order of the calls.
+    The pastes are postponed until the next vector drawing or 'flush',
+    since aggdraw must then read the image again.
+    Attributes:
+    - img
+    - canvas: the aggdraw canvas, or None if it must be created again from the image
+    - pastes: list of the postponed pastes (color, position, mask), or composites (image, position, None)
+    """
+    def __init__(self, img):
+        self.img = img
+        self.canvas = aggdraw.Draw(img)
+        self.pastes = []
+
+    def __getattr__(self, name):
+        # Only called for the methods of aggdraw.Draw.
+        if not self.pastes == []:
+            self.paste_all()
+        if self.canvas == None:
+            self.canvas = aggdraw.Draw(self.img)
+        return getattr(self.canvas, name)
+
+    def paste(self, color, position, mask):
+        self.pastes.append((color, position, mask))
+
+    def composite(self, image, position):
+        """ Draws the RGBA image 'image' over the image of the canvas, its upper left corner at 'position'. """
+        self.pastes.append((image, position, None))
+
+    def paste_all(self):
+        if not self.canvas == None:
+            self.canvas.flush()
+            self.canvas = None
+        for color, position, mask in self.pastes:
+            if mask == None:
+                box = position + (position[0] + color.size[0], position[1] + color.size[1])
+                self.img.paste(Image.alpha_composite(self.img.crop(box), color), box)
+            else:
+                self.img.paste(color, position, mask)
+        self.pastes = []
+
+    def flush(self):
+        self.paste_all()
+
+# Number of curves drawn as they are, their effects being settled, and of avatars built (see 'Curve.get_drawn_avatar').
+AVATAR_COUNTS = {'settled': 0, 'built': 0}
+
+# Sprites drawn by 'draw_sprites' and 'draw_rigid', least recently used first, by content (see 'get_sprite'
+# and 'draw_rigid'), with the number of bytes they use, at most SPRITE_MEMORY_BUDGET in all.
+SPRITES = OrderedDict()
+SPRITES_SIZE = 0
+SUBPIXELS = 4
+SPRITE_RUN_SPREAD = 4
+
+def get_cached_sprite(key):
+    """ Returns the sprite of 'key' if it is cached (marking it as the most recently used), None otherwise. """
+    if not key in SPRITES:
+        return None
+    sprite = SPRITES.pop(key)
+    SPRITES[key] = sprite
+    return sprite[0]
+
+def cache_sprite(key, sprite, size):
+    """ Caches 'sprite' which uses 'size' bytes, forgetting the least recently used sprites beyond the budget. """
+    global SPRITES_SIZE
+    SPRITES[key] = sprite, size
+    SPRITES_SIZE += size
+    while SPRITES_SIZE > SPRITE_MEMORY_BUDGET and len(SPRITES) > 1:
+        SPRITES_SIZE -= SPRITES.popitem(last = False)[1][1]
+
+def get_masks_size(masks):
+    return sum(mask.size[0]*mask.size[1] for mask in masks if not mask == None)
+
+def get_subpixel_position(x):
+    """ Returns the pixel i and the subpixel s (from 0 to SUBPIXELS - 1) such that x is closest to i + s/SUBPIXELS. """
+    n = int(math.floor(x*SUBPIXELS + 0.5))
+    return n // SUBPIXELS, n % SUBPIXELS
+
+def get_coverage_masks(paths, size, pen_width):
+    """ Returns the coverage masks ('L' images of size 'size') of the brush and of the pen of the aggdraw paths,
+    drawn one after the other, the latter being None if 'pen_width' is 0.
+    """
+    symbols = [aggdraw.Symbol(path) for path in paths]
+    masks = []
+    for pen, brush in ((None, aggdraw.Brush(255)), (aggdraw.Pen(255, pen_width), None)):
+        if pen_width == 0 and not pen == None:
+            masks.append(None)
+            continue
+        mask = Image.new('L', size, 0)
+        canvas = aggdraw.Draw(mask)
+        for symbol in symbols:
+            canvas.symbol(ORIGIN, symbol, pen, brush)
+        canvas.flush()
+        masks.append(mask)
+    return tuple(masks)
+
+def get_sprite(commands, coords, pen_width, subpixel_x, subpixel_y):
+    """ Returns the sprite of a shape drawn by 'draw_sprites': the position of its upper left corner relative
+    to the anchor, and the coverage masks of the brush and of the pen (or None).
+    """
+    key = commands, coords, pen_width, subpixel_x, subpixel_y
+    sprite = get_cached_sprite(key)
+    if sprite == None:
+        margin = pen_width/2.0 + 1
+        x_min, y_min = int(math.floor(min(coords[0::2]) - margin)), int(math.floor(min(coords[1::2]) - margin))
+        x_max, y_max = int(math.ceil(max(coords[0::2]) + margin)), int(math.ceil(max(coords[1::2]) + margin))
+        offset = float(subpixel_x)/SUBPIXELS - x_min, float(subpixel_y)/SUBPIXELS - y_min
+        path = get_aggdraw_path_string(commands, coords, offset)
+        masks = get_coverage_masks([path], (x_max - x_min, y_max - y_min), pen_width)
+        sprite = (x_min, y_min) + masks
+        cache_sprite(key, sprite, get_masks_size(masks))
+    return sprite
+
+def draw_sprites(canvas, curves):
+    """ Draws the curves (typically avatars) on the RasterCanvas 'canvas' by pasting a sprite of each of them,
+    rendered once for its shape (see 'get_sprite'), with the colors of its drawing kit.
+    Suitable for curves whose shape does not change from one frame to the next (e.g. glyphs under Fade or Travel).
+    """
+    for curve in curves:
+        drawing_kit = curve.drawing_kit
+        (i, subpixel_x), (j, subpixel_y) = get_subpixel_position(curve.anchor[0]), get_subpixel_position(curve.anchor[1])
+        x_min, y_min, brush_mask, pen_mask = get_sprite(curve.commands, curve.coords, drawing_kit['pen width'],
+                                                        subpixel_x, subpixel_y)
+        position = i + x_min, j + y_min
+        if not drawing_kit['brush color'] == None:
+            canvas.paste(drawing_kit['brush color'], position, brush_mask)
+        if not pen_mask == None:
+            # aggdraw draws a pen without color in black.
+            canvas.paste(drawing_kit['pen color'] or BLACK, position, pen_mask)
+
+def get_box_area(box):
+    return (box[2] - box[0])*(box[3] - box[1])
+
+def group_boxes(boxes):
+    """ Returns the groups (lists of indices, in order) of consecutive boxes (x_min, y_min, x_max, y_max)
+    such that the box of each group is at most SPRITE_RUN_SPREAD times as large as its boxes together:
+    a sprite of distant curves (e.g. of two Block objects of a Compound object) would be mostly empty.
+    """
+    groups = []
+    union = None
+    for index, box in enumerate(boxes):
+        if not union == None:
+            merged = min(union[0], box[0]), min(union[1], box[1]), max(union[2], box[2]), max(union[3], box[3])
+            area += get_box_area(box)
+            if get_box_area(merged) > SPRITE_RUN_SPREAD*area:
+                union = None
+        if union == None:
+            groups.append([])
+            merged = box
+            area = get_box_area(box)
+        union = merged
+        groups[-1].append(index)
+    return groups
+
+def get_sprite_runs(curves):
+    """ Returns the runs of the curves (see 'get_runs'), split so that they are not spread out (see 'group_boxes'). """
+    result = []
+    for drawing_kit, run in get_runs(curves):
+        for group in group_boxes([get_drawn_box(curve) for curve in run]):
+            result.append((drawing_kit, [run[index] for index in group]))
+    return result
+
+def get_rigid_sprite(key, curves):
+    """ Returns the sprite of the content 'key' (see 'draw_rigid'), made of the curves 'curves':
+    for each run of curves drawn with a single path (see 'get_sprite_runs'), in order, its drawing kit,
+    the position of its upper left corner relative to the anchor of the first curve, and its coverage masks.
+    """
+    sprite = get_cached_sprite(key)
+    if not sprite == None:
+        return sprite
+    subpixel_x, subpixel_y = key[1:]
+    x0, y0 = curves[0].anchor
+    sprite = []
+    size = 0
+    for drawing_kit, run in get_sprite_runs(curves):
+        boxes = [get_drawn_box(curve) for curve in run]
+        x_min, y_min = int(math.floor(min(box[0] for box in boxes) - x0)), int(math.floor(min(box[1] for box in boxes) - y0))
+        x_max, y_max = int(math.ceil(max(box[2] for box in boxes) - x0)), int(math.ceil(max(box[3] for box in boxes) - y0))
+        offset = float(subpixel_x)/SUBPIXELS - x_min - x0, float(subpixel_y)/SUBPIXELS - y_min - y0
+        paths = [get_aggdraw_path_string(curve.commands, curve.coords, add(curve.anchor, offset)) for curve in run]
+        masks = get_coverage_masks([' '.join(paths)], (x_max - x_min, y_max - y_min), drawing_kit[1])
+        size += get_masks_size(masks)
+        sprite.append((drawing_kit, x_min, y_min) + masks)
+    cache_sprite(key, sprite, size)
+    return sprite
+
+def get_rigid_image(key, sprite):
+    """ Returns the sprite 'sprite' of the content 'key' (see 'get_rigid_sprite') as a list of RGBA images,
+    its runs being composited in order with the colors of their drawing kits,
+    with the positions of their upper left corners relative to the anchor of the first curve.
+    The runs are composited into as few images as they are spread out (see 'group_boxes'),
+    typically one: a single paste then draws all the curves, when their colors do not change.
+    """
+    image_key = ('image',) + key
+    result = get_cached_sprite(image_key)
+    if not result == None:
+        return result
+    result = []
+    size = 0
+    boxes = [(x, y, x + brush_mask.size[0], y + brush_mask.size[1]) for drawing_kit, x, y, brush_mask, pen_mask in sprite]
+    for group in group_boxes(boxes):
+        x_min = min(boxes[index][0] for index in group)
+        y_min = min(boxes[index][1] for index in group)
+        x_max = max(boxes[index][2] for index in group)
+        y_max = max(boxes[index][3] for index in group)
+        image = Image.new('RGBA', (x_max - x_min, y_max - y_min), (0, 0, 0, 0))
+        for index in group:
+            drawing_kit, x, y, brush_mask, pen_mask = sprite[index]
+            box = x - x_min, y - y_min, x - x_min + brush_mask.size[0], y - y_min + brush_mask.size[1]
+            for color, mask in ((drawing_kit[2], brush_mask), (drawing_kit[0] or BLACK, pen_mask)):
+                if color == None or mask == None:
+                    continue
+                layer = Image.new('RGBA', mask.size, color)
+                layer.putalpha(mask)
+                image.paste(Image.alpha_composite(image.crop(box), layer), box)
+        result.append((image, x_min, y_min))
+        size += 4*image.size[0]*image.size[1]
+    cache_sprite(image_key, result, size)
+    return result
+
+def get_motion_key(curve, t):
+    """ Returns what the effects of 'curve' do to it at time t, relative to its anchor,
+    or None if one of them changes its shape (only Fade and Travel do not).
+    The avatars of curves with the same key are translated by the same vector,
+    and the colors of their drawing kits changed in the same way.
+    """
+    key = []
+    for effect in curve.effects:
+        state = effect.initial_filter(curve, None, t) # 0 if the effect is over, 1 if it hides the curve
+        if state == 0:
+            continue
+        definition = effect.definition
+        if isinstance(definition, Fade):
+            motion = definition
+        elif isinstance(definition, Travel):
+            motion = round(definition.center[0] - curve.anchor[0], 6), round(definition.center[1] - curve.anchor[1], 6)
+        else:
+            return None
+        if state == 1:
+            key.append((motion, 'hidden'))
+        else:
+            key.append((motion, effect.epochs['begin time'], effect.epochs['end time'], effect.stage, effect.pace))
+    return tuple(key)
+
+def draw_rigid(canvas, curves, t):
+    """ Draws the curves at time t on the RasterCanvas 'canvas' with a single sprite,
+    if their avatars are a translated copy of the curves, with the colors of each drawing kit changed in the same way
+    (e.g. the curves of a Block under Fade or Travel, but not the curves of a Compound under Travel).
+    This is found from the effects of the curves (see 'get_motion_key'), so that only one avatar is computed
+    for each drawing kit.
+    The sprite is cached by content (shapes, relative positions, drawing kits, in order) and subpixel position,
+    its runs of curves (see 'get_rigid_sprite') being pasted in order with the colors of the avatars,
+    or as images if the colors do not change (see 'get_rigid_image').
+    Returns False, without drawing anything, if the avatars are not such a copy,
+    or if one of the curves (which may be given by an iterator) is not a Curve object.
+    """
+    motion = None
+    visible_curves = []
+    kits = []
+    representatives = []
+    content = []
+    for curve in curves:
+        if not isinstance(curve, Curve) or not curve.decoration == []:
+            return False
+        if (t < curve.epochs['begin time']) or (t >= curve.epochs['end time']):
+            continue
+        key = get_motion_key(curve, t)
+        if key == None:
+            return False
+        if motion == None:
+            motion = key
+            x0, y0 = curve.anchor
+        elif not key == motion:
+            return False
+        kit = curve.drawing_kit['pen color'], curve.drawing_kit['pen width'], curve.drawing_kit['brush color']
+        if not kit in kits:
+            kits.append(kit)
+            representatives.append(curve)
+        visible_curves.append(curve)
+        content.append((kit, curve.commands, curve.coords, curve.anchor[0] - x0, curve.anchor[1] - y0))
+    if motion == None:
+        return True
+
+    avatars = [curve.get_drawn_avatar(t) for curve in representatives]
+    x, y = x0 + avatars[0].anchor[0] - representatives[0].anchor[0], y0 + avatars[0].anchor[1] - representatives[0].anchor[1]
+    (i, subpixel_x), (j, subpixel_y) = get_subpixel_position(x), get_subpixel_position(y)
+    key = tuple(content), subpixel_x, subpixel_y
+    sprite = get_rigid_sprite(key, visible_curves)
+    if all(avatar.drawing_kit is curve.drawing_kit for avatar, curve in zip(avatars, representatives)):
+        # The colors do not change (e.g. under Travel, or when the effects are over).
+        for image, x_min, y_min in get_rigid_image(key, sprite):
+            canvas.composite(image, (i + x_min, j + y_min))
+        return True
+    for kit, x_min, y_min, brush_mask, pen_mask in sprite:
+        drawing_kit = avatars[kits.index(kit)].drawing_kit
+        position = i + x_min, j + y_min
+        if not drawing_kit['brush color'] == None:
+            canvas.paste(drawing_kit['brush color'], position, brush_mask)
+        if not pen_mask == None:
+            canvas.paste(drawing_kit['pen color'] or BLACK, position, pen_mask)
+    return True
+
+def get_pen_and_brush(drawing_kit):
+    pen = aggdraw.Pen(drawing_kit['pen color'], drawing_kit['pen width'])
+    if drawing_kit['brush color'] ==  None:
+        brush = None
+    else:
+        brush = aggdraw.Brush(drawing_kit['brush color'])
+    return pen, brush
+
+def get_aggdraw_path_string(commands, coords, offset = ORIGIN):
+    """ Returns the path string used by aggdraw.Symbol,
+    with the vector 'offset' added to the coordinates.
+    """
     result = ''
+    dx, dy = offset
     aux = coords
     i = 0
     if len(coords)/2 == 1:
-        result = 'M'+str(aux[0])+','+str(aux[1])
+        result = 'M'+str(aux[0] + dx)+','+str(aux[1] + dy)
     else:
         for command in commands:
             result += command
             if command == 'Z':
                 result += ' '
             elif command in 'ML':
-                result += str(aux[i])+','+str(aux[i+1])+' '
+                result += str(aux[i] + dx)+','+str(aux[i+1] + dy)+' '
                 i += 2
             elif command in 'SQ':
-                result += str(aux[i])+','+str(aux[i+1])+' '+str(aux[i+2])+','+str(aux[i+3])+' '
+                result += str(aux[i] + dx)+','+str(aux[i+1] + dy)+' '+str(aux[i+2] + dx)+','+str(aux[i+3] + dy)+' '
                 i += 4
             elif command == 'C':
-                result += str(aux[i])+','+str(aux[i+1])+' '+str(aux[i+2])+','+str(aux[i+3])+' '+str(aux[i+4])+','+str(aux[i+5])+' '
+                result += str(aux[i] + dx)+','+str(aux[i+1] + dy)+' '+str(aux[i+2] + dx)+','+str(aux[i+3] + dy)+' '+str(aux[i+4] + dx)+','+str(aux[i+5] + dy)+' '
                 i += 6
             else:
                 pass
     return result
 
+# Number of coordinates of each command, and the command repeated when coordinates follow without a command.
+PATH_COMMAND_SIZES = {'M': 2, 'L': 2, 'H': 1, 'V': 1, 'C': 6, 'S': 4, 'Q': 4, 'T': 2, 'A': 7, 'Z': 0}
+PATH_IMPLICIT_COMMANDS = {'M': 'L', 'm': 'l'}
+PATH_TOKEN = re.compile(r'[MmLlHhVvCcSsQqTtAaZz]|[-+]?(?:\d+\.?\d*|\.\d+)(?:[eE][-+]?\d+)?')
+
 def d_to_coords_and_commands(string):
     """Takes:
         string = the 'd' attribute of a path element from an .svg file
-    and returns tuple 'commands, coords' where:
-        1) commands =  a string containing the commands ('M', 'L', 'C', 'S', 'Q', 'Z') where 'H' and 'V' commands have been converted to 'L' commands;
-        2) coords = a list of coordinates of the control points (in float format).
+    and returns tuple 'coords, commands' where:
+        1) coords = a tuple of coordinates of the control points (in float format);
+        2) commands =  a string containing the commands ('M', 'L', 'C', 'S', 'Q', 'Z'):
+        relative (lowercase) commands are converted to absolute ones, 'H' and 'V' commands to 'L' commands,
+        'T' commands to 'Q' commands and 'A' commands (elliptical arcs) to 'C' commands.
+    The string is read in a single pass.
     """
-    aux = string
-    i = len(string)-1
-    while i>0:
-        if string[i] in  'MLHVCSQZ':
-            aux = aux[:i]+'|'+aux[i:]
-        elif string[i] in 'TAmlhvcsqzta':
-            print("Warning: command '%s' not supported!" % string[i])
+    tokens = PATH_TOKEN.findall(string)
+    coords = []
+    commands = []
+    x, y = 0.0, 0.0 # current point
+    x0, y0 = 0.0, 0.0 # start of the current subpath
+    cx, cy = 0.0, 0.0 # last control point, for 'S' and 'T'
+    previous = 'Z'
+    command = None
+    i = 0
+    while i < len(tokens):
+        if tokens[i].isalpha():
+            command = tokens[i]
+            i += 1
+        elif command == None or command in 'Zz':
+            print("Warning: coordinates without command in path, have been ignored.")
+            break
         else:
-            pass
-        i -= 1
-    aux = aux.split('|')
-    for i in range(len(aux)):
-        aux[i] = [aux[i][0], aux[i][1:]]
-        aux[i][1] = aux[i][1].split()
-    for i in range(0,len(aux)):
-        if aux[i][0][0] == 'Z':
-            x,y = [None,None] # But don't assign these inside aux!  Just for monitoring...
-        elif aux[i][0][0] == 'H':
-            x = aux[i][1][0]
-            aux[i][1] = [x,y]
-            aux[i][0] = 'L'
-        elif aux[i][0][0] == 'V':
-            y = aux[i][1][0]
-            aux[i][1] = [x,y]
-            aux[i][0] = 'L'
+            command = PATH_IMPLICIT_COMMANDS.get(command, command)
+        absolute = command.upper()
+        n = PATH_COMMAND_SIZES[absolute]
+        if absolute == 'A':
+            values, i = read_arc_values(tokens, i)
         else:
-            x,y = aux[i][1][-2:]
-    commands = [item[0] for item in aux]
-    commands = ''.join(commands)
-    coords = [item[1] for item in aux]
-    coords = [float(coord) for item in coords for coord in item]
-    coords = np.array(coords)
-    coords = coords.reshape((2,int(len(coords)/2)),order = 'F')
-    return coords, commands
+            values = [float(token) for token in tokens[i:i + n]]
+            i += n
+        if len(values) < n:
+            print("Warning: command '%s' with missing coordinates in path, has been ignored." % command)
+            break
+        if command.islower():
+            # Relative command: every coordinate is relative to the current point,
+            # except for the radii, rotation and flags of an arc.
+            if absolute == 'H':
+                values[0] += x
+            elif absolute == 'V':
+                values[0] += y
+            elif absolute == 'A':
+                values[5] += x
+                values[6] += y
+            else:
+                values = [value + (y if j % 2 else x) for j, value in enumerate(values)]
+
+        if absolute == 'Z':
+            commands.append('Z')
+            x, y = x0, y0
+        elif absolute == 'M':
+            commands.append('M')
+            coords.extend(values)
+            x, y = x0, y0 = values
+        elif absolute in 'LHV':
+            if absolute == 'H':
+                values = [values[0], y]
+            elif absolute == 'V':
+                values = [x, values[0]]
+            commands.append('L')
+            coords.extend(values)
+            x, y = values
+        elif absolute in 'CS':
+            commands.append(absolute)
+            coords.extend(values)
+            cx, cy, x, y = values[-4:]
+        elif absolute in 'QT':
+            if absolute == 'T':
+                # The control point is the reflection of the previous one, or the current point.
+                if previous in 'QT':
+                    values = [2*x - cx, 2*y - cy] + values
+                else:
+                    values = [x, y] + values
+            commands.append('Q')
+            coords.extend(values)
+            cx, cy, x, y = values
+        else:
+            for control_points in arc_to_cubics(x, y, *values):
+                commands.append('C')
+                coords.extend(control_points)
+            x, y = values[5:]
+        previous = absolute
+    return tuple(coords), ''.join(commands)
+
+def read_arc_values(tokens, i):
+    """ Returns the 7 values of an arc command starting with tokens[i], and the index of the next token.
+    The flags may be written without separators (for example '011' for flags 0 and 1 followed by 1).
+    """
+    values = []
+    while len(values) < 7 and i < len(tokens) and not tokens[i].isalpha():
+        token = tokens[i]
+        if len(values) in (3, 4) and len(token) > 1 and token[0] in '01':
+            values.append(float(token[0]))
+            tokens[i] = token[1:]
+        else:
+            values.append(float(token))
+            i += 1
+    return values, i
+
+def arc_to_cubics(x1, y1, rx, ry, rotation, large_arc, sweep, x2, y2):
+    """ Returns the control points (x, y of the two control points and of the end point)
+    of cubic Bezier curves approximating the elliptical arc of an .svg path,
+    from (x1, y1) to (x2, y2) (see the implementation notes of the SVG specification).
+    """
+    if (x1, y1) == (x2, y2):
+        return []
+    rx, ry = abs(rx), abs(ry)
+    if rx == 0 or ry == 0:
+        return [(x1, y1, x2, y2, x2, y2)]
+    phi = math.radians(rotation)
+    cos_phi, sin_phi = math.cos(phi), math.sin(phi)
+    # Center of the ellipse
+    dx, dy = (x1 - x2)/2.0, (y1 - y2)/2.0
+    x1p = cos_phi*dx + sin_phi*dy
+    y1p = -sin_phi*dx + cos_phi*dy
+    radii_scale = (x1p/rx)**2 + (y1p/ry)**2
+    if radii_scale > 1:
+        rx, ry = rx*math.sqrt(radii_scale), ry*math.sqrt(radii_scale)
+    numerator = rx**2*ry**2 - rx**2*y1p**2 - ry**2*x1p**2
+    factor = math.sqrt(max(numerator, 0)/(rx**2*y1p**2 + ry**2*x1p**2))
+    if large_arc == sweep:
+        factor = -factor
+    cxp, cyp = factor*rx*y1p/ry, -factor*ry*x1p/rx
+    center = cos_phi*cxp - sin_phi*cyp + (x1 + x2)/2.0, sin_phi*cxp + cos_phi*cyp + (y1 + y2)/2.0
+    # Angles
+    theta = math.atan2((y1p - cyp)/ry, (x1p - cxp)/rx)
+    delta = math.atan2((-y1p - cyp)/ry, (-x1p - cxp)/rx) - theta
+    if sweep and delta < 0:
+        delta += 2*math.pi
+    elif not sweep and delta > 0:
+        delta -= 2*math.pi
+    # One cubic curve for each quarter of ellipse at most
+    n = int(math.ceil(abs(delta)/(math.pi/2) - 1e-9))
+    step = delta/n
+    k = 4.0/3*math.tan(step/4)
+    def point(angle):
+        u, v = rx*math.cos(angle), ry*math.sin(angle)
+        return center[0] + cos_phi*u - sin_phi*v, center[1] + sin_phi*u + cos_phi*v
+    def tangent(angle):
+        u, v = -rx*math.sin(angle), ry*math.cos(angle)
+        return cos_phi*u - sin_phi*v, sin_phi*u + cos_phi*v
+    result = []
+    for j in range(n):
+        a, b = theta + j*step, theta + (j + 1)*step
+        p, q = point(a), point(b)
+        dp, dq = tangent(a), tangent(b)
+        result.append((p[0] + k*dp[0], p[1] + k*dp[1], q[0] - k*dq[0], q[1] - k*dq[1], q[0], q[1]))
+    # The end point is exact
+    result[-1] = result[-1][:4] + (x2, y2)
+    return result
 
 
 
@@ -102,7 +593,10 @@ class PostponeTimeUpdatingToEnd(object):
     def __exit__(self, type, value, traceback):
         if self.curve.external_call == False:
             self.curve.update_epochs()
-            self.curve.update_effects(self.old_curve_times)
+            if Batch.active():
+                Batch.record_old_times(self.curve, self.old_curve_times)
+            else:
+                self.curve.update_effects(self.old_curve_times)
         return self
 
 class PostponeGeometricUpdatingToEnd(object):
@@ -117,6 +611,24 @@ class PostponeGeometricUpdatingToEnd(object):
             Graphic.update_cardinals(self.curve)
         return self
 
+# Coordinates transformed by 'Curve.apply_linear', by id of the coordinates and linear transformation
+# (the coordinates are kept, so that their id is not given to other coordinates),
+# least recently used first, for at most MAX_TRANSFORMED_COORDS_LENGTH transformations:
+# curves sharing their coordinates (e.g. the glyphs of .svg files, see 'container.get_glyph_path')
+# still share them once transformed in the same way.
+TRANSFORMED_COORDS = OrderedDict()
+MAX_TRANSFORMED_COORDS_LENGTH = 1024
+
+def get_transformed_coords(coords, T):
+    """ Returns the coordinates 'coords' under the linear transformation 'T' (a (2, 2)-matrix, see 'transform_points'). """
+    key = id(coords), T.tostring()
+    entry = TRANSFORMED_COORDS.pop(key, None)
+    if entry == None or not entry[0] is coords:
+        entry = coords, transform_points(coords, T)
+        if len(TRANSFORMED_COORDS) >= MAX_TRANSFORMED_COORDS_LENGTH:
+            TRANSFORMED_COORDS.popitem(last = False)
+    TRANSFORMED_COORDS[key] = entry
+    return entry[1]
 
 class Curve(Graphic):
     """ Attributes:
@@ -132,15 +644,41 @@ class Curve(Graphic):
     - decoration
     - effects
     """
-    def __init__(self, anchor = ORIGIN, coords = DEFAULT_COORDS, commands = DEFAULT_COMMANDS):
-        self.coords = coords
-        self.cardinals = get_cardinals(self.coords)
-        Graphic.__init__(self, anchor, self.cardinals)
+    __slots__ = ('stored_coords', 'commands', 'drawing_kit', 'decoration', 'effects')
+
+    def __init__(self, anchor = ORIGIN, coords = DEFAULT_COORDS, commands = DEFAULT_COMMANDS, cardinals = None):
+        self.linear = None
+        self.stored_coords = coords
+        # The cardinals of 'coords' may be specified if already known (see 'container.get_glyph_path').
+        if cardinals == None:
+            cardinals = get_cardinals(coords)
+        Graphic.__init__(self, anchor, cardinals)
         self.commands = self.initialize_commands(commands)
         self.drawing_kit = dict(DEFAULT_DRAWING_KIT)
         self.decoration = []
         self.effects = []
 
+    def get_coords(self):
+        if Transforms.pending:
+            Transforms.flush()
+        if not self.linear is None:
+            self.apply_linear()
+        return self.stored_coords
+
+    def set_coords(self, coords):
+        if Transforms.pending:
+            Transforms.flush()
+        if not self.linear is None:
+            self.apply_linear()
+        self.stored_coords = coords
+
+    coords = property(get_coords, set_coords)
+
+    def apply_linear(self):
+        """ Applies the pending linear transformation to the coordinates (relative to the anchor) and the cardinals. """
+        self.stored_coords = get_transformed_coords(self.stored_coords, self.linear)
+        Graphic.apply_linear(self)
+
     def initialize_commands(self, commands):
         if commands[-1] == 'Z':
             Z = 'Z'
@@ -218,11 +756,11 @@ class Curve(Graphic):
         self.drawing_kit['brush color'] = brush_color
 
     def add_effects(self, *effects):
+        Batch.synchronize_effects(self)
         for effect in effects:
-            effect_copy = copy.deepcopy(effect)
-            effect_copy.masters = [self]
-            self.effects.append(effect_copy)
-            self.synchronize_effect(effect_copy)
+            bound_effect = BoundEffect(effect.share(), self)
+            self.effects.append(bound_effect)
+            self.synchronize_effect(bound_effect)
 
     def synchronize_effect(self, effect):
         dt = effect.epochs['end time'] - effect.epochs['begin time']
@@ -245,6 +783,8 @@ class Curve(Graphic):
                 dt_end = effect.epochs['end time'] - old_times[1]
                 effect.epochs['end time'] = max(times[1] + dt_end, self.epochs['begin time'])
                 effect.epochs['begin time'] = max(times[1] + dt_end - dt, self.epochs['begin time'])
+        for master in self.masters:
+            master.update_element_effects(self, old_times)
 
     # -------------------- GEOMETRIC METHODS --------------------
     def foot(self):
@@ -265,12 +805,10 @@ class Curve(Graphic):
 
     def homothety(self, center, sx, sy):
         with PostponeGeometricUpdatingToEnd(self):
-            self.coords = homothety(self.coords, ORIGIN, sx, sy)
             Graphic.homothety(self, center, sx, sy)
     
     def rotate(self, center, angle):
         with PostponeGeometricUpdatingToEnd(self):
-            self.coords = rotate(self.coords, ORIGIN, angle)
             Graphic.rotate(self, center, angle)
     
     def move_to(self,p):
@@ -279,30 +817,60 @@ class Curve(Graphic):
 
     def corrugate(self, center):
         with PostponeGeometricUpdatingToEnd(self):
-            self.coords = col_to_array(2, self.coords, corrugate, ORIGIN)
+            self.coords = corrugate(self.coords, ORIGIN)
             Graphic.corrugate(self, center)
 
     # -------------------- DRAWING METHODS --------------------
     def draw(self, canvas, *t):
         if len(t) == 0:
-            pen = aggdraw.Pen(self.drawing_kit['pen color'], self.drawing_kit['pen width'])
-            if self.drawing_kit['brush color'] ==  None:
-                brush = None
-            else:
-                brush = aggdraw.Brush(self.drawing_kit['brush color'])
+            pen, brush = get_pen_and_brush(self.drawing_kit)
             draw(self.anchor, self.commands, self.coords, canvas, pen, brush)
             self.draw_decoration(canvas)
             return
+
+        avatar = self.get_drawn_avatar(t[0])
+        if avatar is self:
+            self.draw(canvas)
+        elif not avatar == None:
+            avatar.draw(canvas)
+
+    def is_settled(self, t):
+        """ Returns True if all effects of the curve are over (intro) or not started yet (outro) at time t,
+        so that its avatar is a copy of the curve.
+        """
+        for effect in self.effects:
+            if not effect.initial_filter(self, None, t) == 0:
+                return False
+        return True
+
+    def get_drawn_avatar(self, t):
+        """ Returns the avatar of the curve at time t (see 'get_avatar'), or the curve itself if its effects are settled
+        (see 'is_settled'), in which case no avatar is built. The result is only meant to be drawn, not modified.
+        The number of each case is counted in AVATAR_COUNTS.
+        """
+        if (t < self.epochs['begin time']) or (t >= self.epochs['end time']):
+            return None
+        if self.is_settled(t):
+            AVATAR_COUNTS['settled'] += 1
+            return self
+        AVATAR_COUNTS['built'] += 1
+        return self.get_avatar(t)
+
+    def get_avatar(self, *t):
+        """ Returns the curve itself if no time is given,
+        otherwise its avatar at time t[0], or None if the curve is not visible at that time.
+        """
+        if len(t) == 0:
+            return self
         else:
             t = t[0] # unpacking gives a list, which should be a single integer.
 
         if (t < self.epochs['begin time']) or (t >= self.epochs['end time']):
-            pass
-        else:
-            avatar = self.update_avatar(t)
+            return None
+        avatar = self.update_avatar(t)
+        if not avatar == None:
             avatar.decoration = self.decoration
-            if not avatar == None:
-                avatar.draw(canvas)
+        return avatar
     
     def draw_decoration(self, canvas):
         for D in self.decoration:
@@ -542,6 +1110,8 @@ class Point(Curve):
     - decoration
     - effects
     """
+    __slots__ = ()
+
     def __init__(self, center = ORIGIN, radius = 3):
         """ Input argument 'center' is a tuple with the (absolute) (x,y)-coordinates of the point.
         """
@@ -575,6 +1145,8 @@ class Polyline(Curve):
     - decoration
     - effects
     """
+    __slots__ = ()
+
     def __init__(self, points = (W/4, H/4, W/2, H, 2*W/3, H/4)):
         """ Input argument 'points' is a tuple 
         containing the (absolute) (x,y)-coordinates of the vertices of the polyline.
@@ -605,6 +1177,8 @@ class RegularPolygon(Polyline):
     - decoration
     - effects
     """
+    __slots__ = ()
+
     def __init__(self, center = CENTER, radius = H/4, edge_number = 6):
         N = edge_number
         angle = np.arange(0, 2*math.pi, 2*math.pi/float(N))
@@ -629,6 +1203,8 @@ class Circle(RegularPolygon):
     - decoration
     - effects
     """
+    __slots__ = ()
+
     def __init__(self, center = CENTER, radius = W/16):
         RegularPolygon.__init__(self,
                                 center = center,
@@ -649,6 +1225,8 @@ class Arc(Polyline):
     - decoration
     - effects
     """
+    __slots__ = ()
+
     def __init__(self, center = CENTER, radius = H/4, angle_init = -math.pi/6, angle_fin = -math.pi/4):
         N = int(radius)
         angles = np.array([angle_init + i/float(N)*(angle_fin-angle_init) for i in range(N+1)])
@@ -674,6 +1252,8 @@ class Rectangle(Polyline):
     - decoration
     - effects
     """
+    __slots__ = ()
+
     def __init__(self, anchor = CENTER, width = W/4, height = H/4):
         nw = anchor
         sw = translate(anchor, (0, height))
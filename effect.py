@@ -7,20 +7,50 @@
 
 from constants import *
 from helpers import *
-from geometry import col_to_array, wring, translate
-from primitive import Primitive
+from geometry import wring, Cardinals
+from primitive import Primitive, Epochs
+import copy
 import inspect
+from collections import OrderedDict
 import math
+import numpy as np
 
 
 # ------------------------------------------------------------------------------------------------------------------------
 def initialize_epochs(stage, duration):
     if stage == 'intro':
-        return dict({'begin time': 0, 'end time': duration})
+        return Epochs({'begin time': 0, 'end time': duration})
     elif stage == 'outro':
-        return dict({'begin time': - duration, 'end time': 0})
+        return Epochs({'begin time': - duration, 'end time': 0})
     else:
-        return dict(DEFAULT_EPOCHS)
+        return Epochs(DEFAULT_EPOCHS)
+
+def get_drawing_kit_key(drawing_kit):
+    return drawing_kit['pen color'], drawing_kit['pen width'], drawing_kit['brush color']
+
+# Progress rates of effects at each frame of their epochs, by timing (see 'get_progress_table').
+PROGRESS_TABLES = {}
+MAX_PROGRESS_TABLE_LENGTH = 100000
+
+def get_progress_table(begin_time, end_time, stage, pace):
+    """ Returns the list of the progress rates (see 'Effect.get_progress_rate') of an effect with the given timing
+    at the frames begin_time, begin_time + 1, ..., end_time, computed once and shared by all effects with this timing,
+    or None if the epochs are not frames (whole numbers).
+    """
+    key = begin_time, end_time, stage, pace
+    if not key in PROGRESS_TABLES:
+        lifespan = end_time - begin_time
+        if lifespan > MAX_PROGRESS_TABLE_LENGTH or not lifespan == int(lifespan) or not begin_time == int(begin_time):
+            PROGRESS_TABLES[key] = None
+        else:
+            if lifespan <= 0:
+                s = np.zeros(1)
+            else:
+                s = np.arange(int(lifespan) + 1)/float(lifespan)
+            if stage == 'intro':
+                s = 1 - s
+            PROGRESS_TABLES[key] = np.asarray(apply_pace(pace, s), dtype = float).tolist()
+    return PROGRESS_TABLES[key]
 
 class Effect(Primitive):
     """Attributes:
@@ -28,15 +58,72 @@ class Effect(Primitive):
     - masters
     - epochs
     - stage
+    - pace
+    - shared
+    - memo: None, or the number of progress levels, the maximum number of results and the results (see 'memoize')
     """
+    __slots__ = ('stage', 'pace', 'shared', 'memo')
+
     def __init__(self, stage = 'intro', pace = 'smooth', duration = DEFAULT_EFFECT_DURATION):
         Primitive.__init__(self)
         self.stage = stage
         self.epochs = initialize_epochs(stage, duration)
         self.pace = pace
-            
+        self.shared = False
+        self.memo = None
+
+    def __setattr__(self, name, value):
+        if getattr(self, 'shared', False):
+            print("WARNING (effect %s)." % self.name),
+            print("Cannot modify attribute '%s' of an effect shared between curves." % name)
+            return
+        Primitive.__setattr__(self, name, value)
+
+    def __setstate__(self, state):
+        """ Restores the attributes of a copy (see 'copy.deepcopy'), including those of a shared effect. """
+        for part in (state if isinstance(state, tuple) else (state,)):
+            for name, value in (part or {}).items():
+                object.__setattr__(self, name, value)
+
+    # -------------------- SHARING METHODS --------------------
+    def freeze(self):
+        """ Makes the effect immutable, so that it can be shared between curves. """
+        if not self.shared:
+            self.shared = True
+        return self
+
+    def share(self):
+        """ Returns an immutable copy of the effect, which can be shared between curves.
+        Effects which are already shared are returned as is.
+        """
+        if self.shared:
+            return self
+        return copy.deepcopy(self).freeze()
+
+    def thaw(self):
+        """ Returns a copy of the effect which can be modified, even if the effect is shared. """
+        result = copy.deepcopy(self)
+        object.__setattr__(result, 'shared', False)
+        return result
+
+    def memoize(self, levels = 256, size = 16384):
+        """ Makes the effect remember its results (the anchor, coordinates, commands, cardinals and drawing kit
+        of the avatars), the progress rate being rounded to one of 'levels' + 1 levels: states which cannot be told apart
+        are computed once, e.g. when frames are drawn again, or with a pace which barely moves.
+        256 levels suit colors (integers from 0 to 255), effects moving curves by n pixels need about 8*n levels.
+        At most 'size' results are kept (one per curve and level), the least recently used being forgotten first.
+        Worth it for effects which change the shape of curves (Zoom, Spin, Wring...), less so for Fade or Travel.
+        Must be called before the effect is added to graphics. Returns the effect.
+        """
+        self.memo = levels, size, OrderedDict()
+        return self
+
     # -------------------- BASIC METHODS --------------------
     def get_progress_rate(self, t):
+        begin_time, end_time = self.epochs['begin time'], self.epochs['end time']
+        table = get_progress_table(begin_time, end_time, self.stage, self.pace)
+        if not table == None and t == int(t):
+            return table[min(max(int(t - begin_time), 0), len(table) - 1)]
         if self.epochs['end time'] <= self.epochs['begin time']:
             s = 0
         else:
@@ -55,6 +142,49 @@ class Effect(Primitive):
            or ((self.epochs['end time'] < t) and (self.stage == 'outro')):
             return 1
 
+    def apply_to(self, curve, avatar, t):
+        if self.initial_filter(curve, avatar, t) == 0:
+            return 
+        if self.initial_filter(curve, avatar, t) == 1:
+            self.hide(avatar)
+            return
+        if self.memo == None:
+            self.apply_progress(curve, avatar, self.get_progress_rate(t))
+        else:
+            self.apply_memoized_progress(curve, avatar, self.get_progress_rate(t))
+
+    def apply_memoized_progress(self, curve, avatar, s):
+        """ Modifies 'avatar' as 'apply_progress' with 's' rounded (see 'memoize'),
+        reusing the result computed for the same rounded progress rate, curve and avatar, if any.
+        """
+        levels, size, results = self.memo
+        level = int(round(s*levels))
+        key = level, curve.anchor, get_drawing_kit_key(curve.drawing_kit), \
+              avatar.anchor, id(avatar.coords), avatar.commands, get_drawing_kit_key(avatar.drawing_kit)
+        result = results.pop(key, None)
+        # The coordinates are kept in the result, so that their id is not given to other coordinates.
+        if result == None or not result[0] is avatar.coords:
+            coords = avatar.coords
+            self.apply_progress(curve, avatar, float(level)/levels)
+            result = coords, avatar.anchor, avatar.coords, avatar.commands, dict(avatar.drawing_kit), \
+                     Cardinals(avatar.cardinals)
+            if len(results) >= size:
+                results.popitem(last = False)
+        else:
+            avatar.anchor, avatar.coords, avatar.commands = result[1:4]
+            avatar.drawing_kit = dict(result[4])
+            avatar.cardinals = Cardinals(result[5])
+        results[key] = result
+
+    def hide(self, avatar):
+        """ Modifies 'avatar' of a curve which is not visible yet (intro) or anymore (outro). """
+        avatar.drawing_kit['pen color'] = None
+        avatar.drawing_kit['brush color'] = None
+
+    def apply_progress(self, curve, avatar, s):
+        """ Modifies 'avatar' of 'curve' according to the progress rate 's' of the effect. """
+        pass
+
     # -------------------- METADATA METHODS --------------------
     def main_class_name(self):
         return 'Effect' #, self.__class__.__name__
@@ -77,6 +207,37 @@ class Effect(Primitive):
         print('{0:<14}'.format(self.stage))
 
 
+class BoundEffect(Effect):
+    """ Effect added to a curve:
+    refers to a shared (immutable) effect, its definition, and carries its own epochs.
+    Attributes:
+    - name
+    - masters
+    - epochs
+    - stage
+    - pace
+    - shared
+    - definition
+    """
+    __slots__ = ('definition',)
+
+    def __init__(self, definition, curve):
+        Primitive.__init__(self)
+        self.stage = definition.stage
+        self.pace = definition.pace
+        self.shared = False
+        self.memo = definition.memo
+        self.definition = definition
+        self.masters = [curve]
+        self.epochs = Epochs(definition.epochs)
+
+    def hide(self, avatar):
+        self.definition.hide(avatar)
+
+    def apply_progress(self, curve, avatar, s):
+        self.definition.apply_progress(curve, avatar, s)
+
+
 class Fade(Effect):
     """Attributes:
     - masters
@@ -85,6 +246,8 @@ class Fade(Effect):
     - drawing_kit
     - tools
     """
+    __slots__ = ('drawing_kit', 'tools')
+
     def __init__(self,
                  stage = 'intro',
                  tools = ['pen', 'brush'],
@@ -101,18 +264,13 @@ class Fade(Effect):
         self.tools = list(tools)
 
 
-    def apply_to(self, curve, avatar, t):
-        if self.initial_filter(curve, avatar, t) == 0:
-            return 
-        if self.initial_filter(curve, avatar, t) == 1:
-            if 'pen' in self.tools:
-                avatar.drawing_kit['pen color'] = None
-            if 'brush' in self.tools:
-                avatar.drawing_kit['brush color'] = None
-            return
-        
-        s = self.get_progress_rate(t)
+    def hide(self, avatar):
+        if 'pen' in self.tools:
+            avatar.drawing_kit['pen color'] = None
+        if 'brush' in self.tools:
+            avatar.drawing_kit['brush color'] = None
 
+    def apply_progress(self, curve, avatar, s):
         if ('pen' in self.tools)  and (not curve.drawing_kit['pen color'] == None):
             pen_color = interpolate_colors(curve.drawing_kit['pen color'], self.drawing_kit['pen color'], s)
             avatar.drawing_kit['pen color'] = pen_color
@@ -121,20 +279,13 @@ class Fade(Effect):
             avatar.drawing_kit['brush color'] = brush_color
 
 class Travel(Effect):
+    __slots__ = ('center',)
+
     def __init__(self, stage = 'intro', center = ORIGIN, pace = 'smooth', duration = DEFAULT_EFFECT_DURATION):
         Effect.__init__(self, stage = stage, pace = pace, duration = duration)
         self.center = center
 
-    def apply_to(self, curve, avatar, t):
-        if self.initial_filter(curve, avatar, t) == 0:
-            return 
-        if self.initial_filter(curve, avatar, t) == 1:
-            avatar.drawing_kit['pen color'] = None
-            avatar.drawing_kit['brush color'] = None
-            return
-        
-        s = self.get_progress_rate(t)
-
+    def apply_progress(self, curve, avatar, s):
         avatar.anchor = interpolate(curve.anchor, self.center, s)
 
 
@@ -147,22 +298,15 @@ class Zoom(Effect):
     - center
     - scale
     """
+    __slots__ = ('center', 'ratio')
+
     def __init__(self, stage = 'intro', center = ORIGIN, ratio = 1, pace = 'smooth', duration = DEFAULT_EFFECT_DURATION):
         Effect.__init__(self, stage = stage, pace = pace, duration = duration)
         self.center = center
         self.ratio = ratio
         
 
-    def  apply_to(self, curve, avatar, t):
-        if self.initial_filter(curve, avatar, t) == 0:
-            return 
-        if self.initial_filter(curve, avatar, t) == 1:
-            avatar.drawing_kit['pen color'] = None
-            avatar.drawing_kit['brush color'] = None
-            return
-        
-        s = self.get_progress_rate(t)
-
+    def  apply_progress(self, curve, avatar, s):
         avatar.homothety(center = self.center,
                          sx = interpolate(1, self.ratio, s),
                          sy = interpolate(1, self.ratio, s))
@@ -175,19 +319,14 @@ class Spin(Effect):
     - center
     - angle
     """
+    __slots__ = ('center', 'angle')
+
     def __init__(self, stage = 'intro', center = ORIGIN, angle = 0, pace = 'smooth', duration = DEFAULT_EFFECT_DURATION):
         Effect.__init__(self, stage = stage, pace = pace, duration = duration)
         self.center = center
         self.angle = angle
 
-    def  apply_to(self, curve, avatar, t):
-        if self.initial_filter(curve, avatar, t) == 0:
-            return 
-        if self.initial_filter(curve, avatar, t) == 1:
-            avatar.drawing_kit['pen color'] = None
-            avatar.drawing_kit['brush color'] = None
-            return
-        s = self.get_progress_rate(t)
+    def  apply_progress(self, curve, avatar, s):
         avatar.rotate(self.center, - self.angle)
         avatar.homothety(center = self.center,
                          sx = 1,
@@ -202,19 +341,14 @@ class Sunrise(Effect):
     - center
     - angle
     """
+    __slots__ = ('center', 'angle')
+
     def __init__(self, stage = 'intro', center = ORIGIN, angle = 0, pace = 'smooth', duration = DEFAULT_EFFECT_DURATION):
         Effect.__init__(self, stage = stage, pace = pace, duration = duration)
         self.center = center
         self.angle = angle
 
-    def  apply_to(self, curve, avatar, t):
-        if self.initial_filter(curve, avatar, t) == 0:
-            return 
-        if self.initial_filter(curve, avatar, t) == 1:
-            avatar.drawing_kit['pen color'] = None
-            avatar.drawing_kit['brush color'] = None
-            return
-        s = self.get_progress_rate(t)
+    def  apply_progress(self, curve, avatar, s):
         avatar.rotate(self.center, - self.angle)
         avatar.homothety(center = self.center,
                          sx = 1,
@@ -229,6 +363,8 @@ class Wring(Effect):
     - center
     - amplitude
     """
+    __slots__ = ('center', 'amplitude')
+
     def __init__(self,
                  stage = 'intro',
                  center = ORIGIN,
@@ -238,53 +374,61 @@ class Wring(Effect):
         self.center = center
         self.amplitude = amplitude
 
-    def  apply_to(self, curve, avatar, t):
-        if self.initial_filter(curve, avatar, t) == 0:
-            return 
-        if self.initial_filter(curve, avatar, t) == 1:
-            avatar.drawing_kit['pen color'] = None
-            avatar.drawing_kit['brush color'] = None
-            return
+    def  apply_progress(self, curve, avatar, s):
+        f = s*NORMAL_NUMBER_OF_CHARACTERS_HORIZONTALLY/(2*W)
+        avatar.coords = wring(avatar.coords, self.center, self.amplitude, f, avatar.anchor)
 
-        s = self.get_progress_rate(t)
 
-        f = s*NORMAL_NUMBER_OF_CHARACTERS_HORIZONTALLY/(2*W)
-        avatar.coords = translate(\
-                                  col_to_array(\
-                                               2, translate(\
-                                                            avatar.coords,
-                                                            avatar.anchor),
-                                               wring, self.center, self.amplitude, f),
-                                  scale(-1, avatar.anchor))
-        
-        
+# Vertices traced by 'Trace' (the first vertex being repeated at the end for closed curves)
+# and commands of a polyline through all of them and one more point, or None for curves which are not polygonal,
+# by id of the coordinates of the curve (which are kept, so that their id is not given to other coordinates),
+# least recently used first, for at most MAX_TRACE_VERTICES_LENGTH curves.
+TRACE_VERTICES = OrderedDict()
+MAX_TRACE_VERTICES_LENGTH = 1024
+
+def get_trace_vertices(coords, commands):
+    """ Returns the vertices traced by 'Trace' along the curve of coordinates 'coords' and commands 'commands',
+    and the commands of a polyline through all of them and one more point, or None if the curve is not polygonal.
+    Computed once for each curve, as long as it is among the curves traced most recently.
+    """
+    entry = TRACE_VERTICES.pop(id(coords), None)
+    if entry == None or not entry[0] is coords or not entry[1] == commands:
+        if not 'M'+'L'*(len(coords)/2-1) in commands:
+            result = None
+        else:
+            if commands[-1] == 'Z':
+                vertices = coords + select_point(coords, index = 0)
+            else:
+                vertices = coords
+            # The traced polyline has at most one point more than the vertices (the point at 'index').
+            result = vertices, 'M' + 'L'*(len(vertices)/2)
+        entry = coords, commands, result
+        if len(TRACE_VERTICES) >= MAX_TRACE_VERTICES_LENGTH:
+            TRACE_VERTICES.popitem(last = False)
+    TRACE_VERTICES[id(coords)] = entry
+    return entry[2]
+
 class Trace(Effect):
+    __slots__ = ('index',)
+
     def __init__(self, stage = 'intro', index = 0.5, pace = 'smooth', duration = DEFAULT_EFFECT_DURATION):
         Effect.__init__(self, stage = stage, pace = pace, duration = duration)
         self.index = max(min(index, 1), 0)
     
-    def apply_to(self, curve, avatar, t):
-        if self.initial_filter(curve, avatar, t) == 0:
-            return 
-        if self.initial_filter(curve, avatar, t) == 1:
-            avatar.drawing_kit['pen color'] = None
-            avatar.drawing_kit['brush color'] = None
-            return
-
-        if not 'M'+'L'*(len(curve.coords)/2-1) in curve.commands:
+    def apply_progress(self, curve, avatar, s):
+        """ Traces the polyline through the vertices of the curve (see 'get_trace_vertices') from the point at 'index'
+        (a fraction of the number of vertices) in both directions, up to the points at progress rate s.
+        Only these points are computed, and the vertices in between are copied by slicing.
+        """
+        result = get_trace_vertices(curve.coords, curve.commands)
+        if result == None:
             print("WARNING."),
             print("Effect 'Trace' only supported for polygonal curves.")
             return
         else:
-            if curve.commands[-1] == 'Z':
-                coords = curve.coords + select_point(curve.coords, index = 0)
-            else:
-                coords = curve.coords
-            
-            L = len(coords)/2
-            commands = 'M' + 'L'*(L - 1)
+            coords, all_commands = result
 
-            s = self.get_progress_rate(t)
+            L = len(coords)/2
 
             i = self.index*(L-1)
             j = int(i)
@@ -324,7 +468,7 @@ class Trace(Effect):
             else:
                 coords = aux + coords[2*(j + 1): 2*m1] + p1
 
-            commands = 'M'+'L'*((j - m0) + (m1 - 1 -j) + 2)
+            commands = all_commands[:(j - m0) + (m1 - 1 -j) + 3]
 
         avatar.coords = coords
         avatar.commands = commands
@@ -333,9 +477,12 @@ class Trace(Effect):
 # DISTRIBUTIVE EFFECTS
 # These effects are not added to Curve objects.
 # They need to be processed by Container objects
-# which will decide which (other) effects to add to elements.
+# which will decide which (other) effects to add to elements,
+# or hold them as a single DistributedEffect (see Block.add_distributed_effect).
 
 class Reveal(Effect):
+    __slots__ = ('tools', 'order', 'ordering')
+
     def __init__(self,
                  stage = 'intro',
                  tools = ['pen', 'brush'],
@@ -345,7 +492,7 @@ class Reveal(Effect):
                  duration = DEFAULT_EFFECT_DURATION,
                  **kwargs):
         Effect.__init__(self, stage = stage, pace = pace, duration = DEFAULT_EFFECT_DURATION)
-        self.epochs = dict(epochs) # <----- THIS OVERRIDE THE EPOCHS SET BY Effect.__init__!!!!
+        self.epochs = Epochs(epochs) # <----- THIS OVERRIDE THE EPOCHS SET BY Effect.__init__!!!!
         self.tools = list(tools)
         self.order = order
         self.ordering = self.initialize_ordering(**kwargs)
@@ -356,12 +503,13 @@ class Reveal(Effect):
         else:
             return None
 
-    def apply_to(self, curve, avatar, t):
+    def apply_progress(self, curve, avatar, s):
         print("WARNING."),
         print("Effect '%s' not supported."%self.__class__.__name__)
-        return avatar
 # ------------------------------------------------------------        
 class ThreeBlueOneBrown(Effect):
+    __slots__ = ('order',)
+
     def __init__(self,
                  stage = 'intro',
                  pace = 'smooth',
@@ -370,6 +518,8 @@ class ThreeBlueOneBrown(Effect):
         self.order = order
 # ------------------------------------------------------------
 class Trickle(Effect):
+    __slots__ = ('separation', 'order')
+
     def __init__(self,
                  stage = 'intro',
                  separation = (0, -2*H),
@@ -378,7 +528,133 @@ class Trickle(Effect):
         Effect.__init__(self, stage = stage, pace = pace, duration = duration)
         self.separation = separation
         self.order = order
-    
+
+# ------------------------------------------------------------
+class DistributedEffect(Effect):
+    """ Distributive effect (Trickle, Reveal) held by a Block, in place of one effect per element:
+    each element is given its own epochs (and, for Travel, its own center),
+    stored in arrays so that the progress rates of all elements are computed at once.
+    Attributes:
+    - name
+    - masters
+    - epochs
+    - stage
+    - pace
+    - shared
+    - definition: the (shared) effect applied to each element, Travel or Fade
+    - indices: dictionary giving the index of each element in the arrays below
+    - begin_times
+    - end_times
+    - centers: for Travel only, the center of each element, otherwise None
+    - progress_table: the progress rates of the elements at each frame (see 'get_progress_rates'), computed when needed
+    """
+    __slots__ = ('definition', 'indices', 'begin_times', 'end_times', 'centers', 'progress_table')
+
+    def __init__(self, definition, block, elements, times, centers = None):
+        """ 'times' contains the epochs of the effect for each element,
+        relative to the epochs of the element as for effects added to a curve.
+        """
+        Primitive.__init__(self)
+        self.stage = definition.stage
+        self.pace = definition.pace
+        self.shared = False
+        self.memo = None
+        self.definition = definition
+        self.masters = [block]
+        self.indices = dict((element, i) for i, element in enumerate(elements))
+        self.centers = None if centers == None else np.array(centers, dtype = float)
+        #
+        element_begin_times = np.array([element.epochs['begin time'] for element in elements], dtype = float)
+        element_end_times = np.array([element.epochs['end time'] for element in elements], dtype = float)
+        times = np.array(times, dtype = float).reshape((-1, 2))
+        dt = times[:, 1] - times[:, 0]
+        if self.stage == 'intro':
+            self.begin_times = np.clip(times[:, 0] + element_begin_times, element_begin_times, element_end_times)
+            self.end_times = np.clip(self.begin_times + dt, element_begin_times, element_end_times)
+        else:
+            self.end_times = np.clip(element_end_times + times[:, 1], element_begin_times, element_end_times)
+            self.begin_times = np.clip(self.end_times - dt, element_begin_times, element_end_times)
+        self.update_epochs()
+
+    def update_epochs(self):
+        self.epochs = Epochs({'begin time': self.begin_times.min(), 'end time': self.end_times.max()})
+        self.progress_table = None
+
+    def get_progress_tables(self):
+        """ Returns the progress rates of the elements at each frame of their epochs, as a flat array
+        with one table (see 'get_progress_table') for each timing, shared by the elements with this timing,
+        the index of the table of each element in that array and the index of its last frame,
+        or None if the epochs are not frames (whole numbers).
+        """
+        if self.progress_table == None:
+            timings, inverse = np.unique(np.stack([self.begin_times, self.end_times], axis = 1),
+                                         axis = 0, return_inverse = True)
+            tables = [get_progress_table(begin_time, end_time, self.stage, self.pace)
+                      for begin_time, end_time in timings.tolist()]
+            if any(table == None for table in tables):
+                self.progress_table = False
+            else:
+                lengths = np.array([len(table) for table in tables])
+                offsets = np.cumsum(lengths) - lengths
+                self.progress_table = np.concatenate(tables), offsets[inverse], offsets[inverse] + lengths[inverse] - 1
+        if self.progress_table is False:
+            return None
+        return self.progress_table
+
+    def update_element_epochs(self, element, old_times):
+        """ Moves the epochs of the effect for 'element' along with those of the element. """
+        if not element in self.indices:
+            return
+        i = self.indices[element]
+        new_times = element.epochs['begin time'], element.epochs['end time']
+        begin_time, end_time = self.begin_times[i], self.end_times[i]
+        dt = end_time - begin_time
+        if self.stage == 'intro':
+            dt_begin = begin_time - old_times[0]
+            begin_time = max(min(new_times[0] + dt_begin, new_times[1]), new_times[0])
+            end_time = max(min(new_times[0] + dt_begin + dt, new_times[1]), new_times[0])
+        elif self.stage == 'outro':
+            dt_end = end_time - old_times[1]
+            end_time = max(min(new_times[1] + dt_end, new_times[1]), new_times[0])
+            begin_time = max(min(new_times[1] + dt_end - dt, new_times[1]), new_times[0])
+        self.begin_times[i], self.end_times[i] = begin_time, end_time
+        self.update_epochs()
+
+    def get_progress_rates(self, t):
+        """ Returns the array of the progress rates of all elements at time t. """
+        table = self.get_progress_tables()
+        if not table == None and t == int(t):
+            rates, first, last = table
+            return rates[np.clip(first + (int(t) - self.begin_times).astype(int), first, last)]
+        lifespans = self.end_times - self.begin_times
+        s = (t - self.begin_times)/np.where(lifespans > 0, lifespans, 1)
+        s = np.clip(np.where(lifespans > 0, s, 0), 0, 1)
+        if self.stage == 'intro':
+            s = 1 - s
+        return apply_pace(self.pace, s)
+
+    def apply_to_avatars(self, elements, avatars, t):
+        """ Modifies the avatars (at time t) of the elements, as 'apply_to' does for a single curve. """
+        if self.stage == 'intro':
+            settled = self.end_times <= t
+            hidden = self.begin_times > t
+        else:
+            settled = self.begin_times >= t
+            hidden = self.end_times < t
+        s = self.get_progress_rates(t)
+        for element, avatar in zip(elements, avatars):
+            if avatar == None or not element in self.indices:
+                continue
+            i = self.indices[element]
+            if settled[i]:
+                continue
+            elif hidden[i]:
+                self.definition.hide(avatar)
+            elif self.centers is None:
+                self.definition.apply_progress(element, avatar, s[i])
+            else:
+                avatar.anchor = interpolate(element.anchor, tuple(self.centers[i]), s[i])
+
 
 
 # ========================================
@@ -6,30 +6,130 @@
 
 import numpy as np
 import math
+from array import array
 from constants import *
 from helpers import *
 
+# Tags of the cardinal points, shared by all 'Cardinals' instances with the same tags.
+CARDINAL_INDICES = {CARDINAL_TAGS: {tag: i for i, tag in enumerate(CARDINAL_TAGS)}}
+
+def get_cardinal_indices(tags):
+    if not tags in CARDINAL_INDICES.keys():
+        CARDINAL_INDICES[tags] = {tag: i for i, tag in enumerate(tags)}
+    return CARDINAL_INDICES[tags]
+
+class Cardinals(object):
+    """ Compact replacement for the dictionary of cardinal points of a 'Graphic'.
+    The (x,y)-coordinates are stored in a single array,
+    and the tags (nw, w, sw, s, se, e, ne, n, c, and possibly others) are shared between instances.
+    Supports the same item access as a dictionary,
+    as well as the methods 'keys', 'values' and 'items'.
+    """
+    __slots__ = ('tags', 'indices', 'xy')
+
+    def __init__(self, cardinals = DEFAULT_CARDINALS):
+        if isinstance(cardinals, Cardinals):
+            self.tags = cardinals.tags
+            self.indices = cardinals.indices
+            self.xy = array('d', cardinals.xy)
+        else:
+            keys = list(cardinals.keys())
+            if set(keys) == set(CARDINAL_TAGS):
+                keys = CARDINAL_TAGS
+            self.tags = tuple(keys)
+            self.indices = get_cardinal_indices(self.tags)
+            self.xy = array('d', flatten(tuple(cardinals[key] for key in self.tags)))
+
+    def __getitem__(self, key):
+        i = 2*self.indices[key]
+        return self.xy[i], self.xy[i + 1]
+
+    def __setitem__(self, key, value):
+        if not key in self.indices:
+            self.tags = self.tags + (key,)
+            self.indices = get_cardinal_indices(self.tags)
+            self.xy.extend((0, 0))
+        i = 2*self.indices[key]
+        self.xy[i] = value[0]
+        self.xy[i + 1] = value[1]
+
+    def __iter__(self):
+        return iter(self.tags)
+
+    def transform(self, T):
+        """ Applies the linear transformation 'T' (a (2, 2)-matrix) to all cardinal points. """
+        self.xy = array('d', transform_points(tuple(self.xy), T))
+
+    def __contains__(self, key):
+        return key in self.indices
+
+    def __len__(self):
+        return len(self.tags)
+
+    def __repr__(self):
+        return repr(dict(self.items()))
+
+    def keys(self):
+        return list(self.tags)
+
+    def values(self):
+        return [self[key] for key in self.tags]
+
+    def items(self):
+        return [(key, self[key]) for key in self.tags]
+
 def get_cardinals(coords):
     """"" 
     Takes: an array with coordinates of points.
-    Returns: a dictionary of the cardinal points (nw, w, sw, s, se, e, ne, n, c) of the bounding box corresponding to the points.
+    Returns: the cardinal points (nw, w, sw, s, se, e, ne, n, c) of the bounding box corresponding to the points,
+    as a 'Cardinals' instance.
     """
     xmin = min(coords[0::2])
     xmax = max(coords[0::2])
     ymin = min(coords[1::2])
     ymax = max(coords[1::2])
-    result = {}
-    result['nw'] = (xmin, ymin)
-    result['sw'] = (xmin, ymax)
-    result['se'] = (xmax, ymax)
-    result['ne'] = (xmax, ymin)
-    result['w'] = interpolate(result['nw'], result['sw'], 0.5)
-    result['e'] = interpolate(result['ne'], result['se'], 0.5)
-    result['n'] = interpolate(result['nw'], result['ne'], 0.5)
-    result['s'] = interpolate(result['sw'], result['se'], 0.5)
-    result['c'] = interpolate(result['n'], result['s'], 0.5)
+    xmid = 0.5*xmin + 0.5*xmax
+    ymid = 0.5*ymin + 0.5*ymax
+    result = Cardinals.__new__(Cardinals)
+    result.tags = CARDINAL_TAGS
+    result.indices = CARDINAL_INDICES[CARDINAL_TAGS]
+    # same order as CARDINAL_TAGS: nw, w, sw, s, se, e, ne, n, c
+    result.xy = array('d', (xmin, ymin, xmin, ymid, xmin, ymax, xmid, ymax,
+                            xmax, ymax, xmax, ymid, xmax, ymin, xmid, ymin, xmid, ymid))
     return result
 
+# -------------------- MATRICES --------------------
+# Affine transformations of the plane are represented by (3, 3)-matrices acting on (x, y, 1),
+# their linear parts by (2, 2)-matrices.
+
+def affine_matrix(T, center = ORIGIN):
+    """ Returns the matrix of the affine transformation with linear part 'T' fixing the point 'center'. """
+    M = np.identity(3)
+    M[:2, :2] = T
+    M[:2, 2] = np.array(center) - np.dot(T, center)
+    return M
+
+def translation_matrix(v):
+    M = np.identity(3)
+    M[:2, 2] = v
+    return M
+
+def homothety_matrix(center, sx, sy):
+    return affine_matrix(tuple_to_matrix(((sx, 0), (0, sy))), center)
+
+def rotation_matrix(center, angle):
+    R = np.array([[math.cos(angle), -math.sin(angle)], [math.sin(angle), math.cos(angle)]])
+    return affine_matrix(R, center)
+
+def transform_points(points, T, v = None):
+    """ Returns the tuple of the coordinates of 'points' (a tuple x0, y0, x1, y1, ...)
+    under the linear transformation 'T', followed by the translation 'v' if any.
+    """
+    aux = np.dot(T, tuple_to_array(points))
+    if not v is None:
+        aux = aux + np.reshape(v, (2, 1))
+    return array_to_tuple(aux)
+
 def affine_transformation(p, origin1, origin2, t):
     dimension = len(t[0])
     P = tuple_to_array(p, dimension = dimension)
@@ -64,15 +164,30 @@ def homothety(p, center, sx, sy):
     result = affine_transformation(p, center, center, t)
     return result
 
-def wring(p, c, a, f):
-    return p[0], c[1]+a*(p[1]-c[1])*math.cos(2*math.pi*(p[0]-c[0])*f)
-
-def corrugate(p, center = ORIGIN):
+def wring(points, c, a, f, offset = ORIGIN):
+    """ Returns the tuple of the coordinates of 'points' (a tuple x0, y0, x1, y1, ..., relative to 'offset')
+    wrung around 'c': each point is moved vertically, its distance to c scaled by a*cos(2*pi*(x - c[0])*f).
+    All points are computed at once.
+    """
+    P = np.array(points, dtype = float)
+    x = P[0::2] + offset[0]
+    P[1::2] = (c[1] + a*(P[1::2] + offset[1] - c[1])*np.cos(2*math.pi*(x - c[0])*f)) - offset[1]
+    P[0::2] = x - offset[0]
+    return tuple(P.tolist())
+
+def corrugate(points, center = ORIGIN):
+    """ Returns the tuple of the coordinates of 'points' (a tuple x0, y0, x1, y1, ...)
+    each under a homothety of center 'center' whose ratio depends on the direction of the point.
+    All points are computed at once.
+    """
     n = 12
     amp = 0.2
-    sx = 1 + amp*math.cos(n*np.arctan2(p[1] -center[1], p[0] - center[0]))
-    sy = sx
-    return homothety(p, center, sx, sy)
+    P = np.array(points, dtype = float)
+    x, y = P[0::2] - center[0], P[1::2] - center[1]
+    s = 1 + amp*np.cos(n*np.arctan2(y, x))
+    P[0::2] = center[0] + s*x
+    P[1::2] = center[1] + s*y
+    return tuple(P.tolist())
 
 
 def col_to_array(dimension, atuple, function, *args, **kwargs):
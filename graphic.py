@@ -15,6 +15,7 @@ import numpy as np
 from constants import *
 from geometry import *
 from primitive import Primitive, filter_by_class
+from collections import OrderedDict
 import inspect
 import PIL as Image
 import aggdraw
@@ -62,6 +63,111 @@ def print_geometry(*args):
 
 
 # ============================== CLASSES ==============================
+class Batch(object):
+    """ Context manager returned by 'Graphic.batch'.
+    Inside a batch, the propagation of epochs and cardinals to the masters
+    and the synchronization of the effects of curves with their epochs are suspended.
+    They are carried out once, when the outermost batch exits,
+    or for the epochs, as soon as the epochs of a container are read (see 'propagate_epochs').
+    Until then, the bounding boxes of containers may be out of date.
+    """
+    depth = 0
+    propagating = False
+    graphics_with_new_epochs = OrderedDict()
+    graphics_with_new_cardinals = OrderedDict()
+    curves_with_old_times = OrderedDict()
+
+    def __enter__(self):
+        Batch.depth += 1
+        return self
+
+    def __exit__(self, type, value, traceback):
+        Batch.depth -= 1
+        if Batch.depth == 0:
+            Batch.reconcile()
+
+    @staticmethod
+    def active():
+        return Batch.depth > 0
+
+    @staticmethod
+    def record_epochs(graphic):
+        Batch.graphics_with_new_epochs[graphic] = None
+
+    @staticmethod
+    def record_cardinals(graphic):
+        Batch.graphics_with_new_cardinals[graphic] = None
+
+    @staticmethod
+    def record_old_times(curve, old_times):
+        """ Records the epochs of 'curve' before its first change within the batch. """
+        if not curve in Batch.curves_with_old_times:
+            Batch.curves_with_old_times[curve] = old_times
+
+    @staticmethod
+    def synchronize_effects(curve):
+        """ Brings the effects of 'curve' in line with its current epochs, e.g. before adding new effects. """
+        if curve in Batch.curves_with_old_times:
+            curve.update_effects(Batch.curves_with_old_times.pop(curve))
+
+    @staticmethod
+    def propagate_epochs():
+        """ Propagates the recorded epochs to the masters, so that the epochs of containers are up to date,
+        e.g. when they are read within the batch.
+        """
+        if Batch.propagating:
+            return
+        Batch.propagating = True
+        try:
+            while Batch.graphics_with_new_epochs:
+                graphic = Batch.graphics_with_new_epochs.popitem(last = False)[0]
+                # The masters record themselves again if their epochs change.
+                for master in graphic.masters:
+                    master.update_element_epochs(graphic)
+        finally:
+            Batch.propagating = False
+
+    @staticmethod
+    def reconcile():
+        while Batch.curves_with_old_times:
+            curve, old_times = Batch.curves_with_old_times.popitem(last = False)
+            curve.update_effects(old_times)
+        while Batch.graphics_with_new_epochs:
+            graphic = Batch.graphics_with_new_epochs.popitem(last = False)[0]
+            Graphic.update_epochs(graphic)
+        while Batch.graphics_with_new_cardinals:
+            graphic = Batch.graphics_with_new_cardinals.popitem(last = False)[0]
+            Graphic.update_cardinals(graphic)
+
+
+class Transforms(object):
+    """ Registry of the containers with a pending transform,
+    i.e. a translation, homothety or rotation which has not been passed down to their elements yet
+    (see 'Container.apply_transform').
+    Pending transforms are all passed down before any anchor, cardinals or coordinates are read or modified.
+    """
+    pending = OrderedDict()
+
+    @staticmethod
+    def register(container):
+        Transforms.pending[container] = None
+
+    @staticmethod
+    def flush():
+        while Transforms.pending:
+            Transforms.flush_container(next(iter(Transforms.pending)))
+
+    @staticmethod
+    def flush_container(container):
+        # The transforms of the masters were applied before that of the container.
+        for master in container.masters:
+            if master in Transforms.pending:
+                Transforms.flush_container(master)
+        if container in Transforms.pending:
+            del Transforms.pending[container]
+            container.push_transform()
+
+
 class Graphic(Primitive):
     """ Attributes: 
     - masters
@@ -69,12 +175,62 @@ class Graphic(Primitive):
     - external_call 
     - anchor
     - cardinals
+    - linear: linear transformation (a (2, 2)-matrix) not applied yet to the cardinals (and coordinates),
+      or None
     """
+    __slots__ = ('external_call', 'stored_anchor', 'stored_cardinals', 'linear')
+
     def __init__(self, anchor = ORIGIN, cardinals = DEFAULT_CARDINALS):
         Primitive.__init__(self)
         self.external_call = False
-        self.anchor = anchor
-        self.cardinals = cardinals
+        self.linear = None
+        # A new graphic is not affected by the pending transforms, which are therefore not applied here.
+        self.stored_anchor = anchor
+        self.stored_cardinals = Cardinals(cardinals)
+
+    # The anchor and the cardinals are read through properties,
+    # so that pending transforms (of the masters, and the linear part of self) are applied first.
+    def get_anchor(self):
+        if Transforms.pending:
+            Transforms.flush()
+        return self.stored_anchor
+
+    def set_anchor(self, anchor):
+        if Transforms.pending:
+            Transforms.flush()
+        self.stored_anchor = anchor
+
+    def get_cardinals(self):
+        if Transforms.pending:
+            Transforms.flush()
+        if not self.linear is None:
+            self.apply_linear()
+        return self.stored_cardinals
+
+    def set_cardinals(self, cardinals):
+        if Transforms.pending:
+            Transforms.flush()
+        if not self.linear is None:
+            self.apply_linear()
+        self.stored_cardinals = cardinals
+
+    anchor = property(get_anchor, set_anchor)
+    cardinals = property(get_cardinals, set_cardinals)
+
+    def apply_linear(self):
+        self.stored_cardinals.transform(self.linear)
+        self.linear = None
+
+    def compose_linear(self, T):
+        if self.linear is None:
+            self.linear = T
+        else:
+            self.linear = np.dot(T, self.linear)
+
+    def transform_geometry(self, M):
+        """ Applies the affine transformation 'M' (a (3, 3)-matrix) to the anchor, and (lazily) to the rest. """
+        self.stored_anchor = transform_points(self.stored_anchor, M[:2, :2], M[:2, 2])
+        self.compose_linear(M[:2, :2])
 
     def width(self):
         return np.linalg.norm(tuple_to_array(self.ne()) - tuple_to_array(self.nw()))
@@ -134,9 +290,20 @@ class Graphic(Primitive):
 
 
     # -------------------- SYNCHRONIZATION METHODS --------------------
+    def batch(self):
+        """ Returns a context manager grouping edits, e.g.
+        with scene.batch():
+            ...
+        so that masters and effects are updated once, at the end.
+        """
+        return Batch()
+
     def update_epochs(self):
+        if Batch.active():
+            Batch.record_epochs(self)
+            return
         for master in self.masters:
-            master.update_epochs()
+            master.update_element_epochs(self)
 
     # GEOMETRIC METHODS
 
@@ -177,6 +344,9 @@ class Graphic(Primitive):
         self.anchor = new_anchor
 
     def update_cardinals(self):
+        if Batch.active():
+            Batch.record_cardinals(self)
+            return
         for master in self.masters:
             master.update_cardinals()
 
@@ -185,13 +355,11 @@ class Graphic(Primitive):
 
     def homothety(self, center, sx, sy):
         self.anchor = homothety(self.anchor, center, sx, sy)
-        for key in self.cardinals.keys():
-            self.cardinals[key] = homothety(self.cardinals[key], ORIGIN, sx, sy)
+        self.compose_linear(tuple_to_matrix(((sx, 0), (0, sy))))
 
     def rotate(self, center, angle):
         self.anchor = rotate(self.anchor, center, angle)
-        for key in self.cardinals.keys():
-            self.cardinals[key] = rotate(self.cardinals[key], ORIGIN, angle)
+        self.compose_linear(rotation_matrix(ORIGIN, angle)[:2, :2])
 
     def move_to(self, p):
         self.anchor = p
@@ -5,9 +5,12 @@
 # Code for global functions with general use.
 
 from constants import *
+import hashlib
 import inspect
 import numpy as np
 import os
+import re
+import subprocess
 import time
 
 def in_seconds(t):
@@ -35,20 +38,57 @@ def smooth_plateau(x):
         result = 1
     return result
 
-def apply_pace(pace, s):
-    result = s
-    if pace == 'linear':
-        result = s
-    elif pace == 'smooth':
-        return smooth(s)
-    elif pace == 'soft landing':
-        return soft_landing(s)
-    elif pace == 'surprise':
-        return surprise(s)
-    else:
-        pass
-    return result
+def linear(x):
+    return x
 
+def cubic_bezier(x1, y1, x2, y2, sample_count = 4097):
+    """ Returns the pace (vectorized function from [0, 1] to [0, 1]) given by the cubic Bezier curve
+    with control points (0, 0), (x1, y1), (x2, y2) and (1, 1), as the CSS function 'cubic-bezier(x1, y1, x2, y2)'.
+    The curve is sampled once, and the pace is evaluated by interpolating in the samples,
+    which are increasing in x since x1 and x2 are in [0, 1].
+    """
+    x1, x2 = min(max(x1, 0), 1), min(max(x2, 0), 1)
+    u = np.linspace(0, 1, sample_count)
+    xs = 3*x1*u*(1 - u)**2 + 3*x2*u**2*(1 - u) + u**3
+    ys = 3*y1*u*(1 - u)**2 + 3*y2*u**2*(1 - u) + u**3
+    def pace(x):
+        return np.interp(x, xs, ys)
+    return pace
+
+# Paces of effects (vectorized functions from [0, 1] to [0, 1]), by name.
+PACES = {
+    'linear': linear,
+    'smooth': smooth,
+    'soft landing': soft_landing,
+    'surprise': surprise,
+    'ease': cubic_bezier(0.25, 0.1, 0.25, 1),
+    'ease-in': cubic_bezier(0.42, 0, 1, 1),
+    'ease-out': cubic_bezier(0, 0, 0.58, 1),
+    'ease-in-out': cubic_bezier(0.42, 0, 0.58, 1),
+}
+
+def register_pace(name, function):
+    """ Makes the vectorized function 'function' available to effects as the pace 'name'. """
+    PACES[name] = function
+
+def get_pace(pace):
+    """ Returns the function of the pace 'pace': a name in PACES or a string 'cubic-bezier(x1, y1, x2, y2)',
+    which is registered the first time. Unknown paces are linear.
+    """
+    if not pace in PACES:
+        match = re.match(r'^\s*cubic-bezier\(([^,]+),([^,]+),([^,]+),([^,]+)\)\s*$', str(pace))
+        try:
+            register_pace(pace, cubic_bezier(*[float(value) for value in match.groups()]))
+        except (AttributeError, ValueError):
+            print("WARNING."),
+            print("Unknown pace '%s', choose among %s or 'cubic-bezier(x1, y1, x2, y2)'. Linear pace is used."
+                  % (pace, sorted(PACES.keys())))
+            register_pace(pace, linear)
+    return PACES[pace]
+
+def apply_pace(pace, s):
+    """ Returns the pace 'pace' (see 'get_pace') applied to 's', a number or an array. """
+    return get_pace(pace)(s)
 
 
 def add(in1, in2):
@@ -155,33 +195,168 @@ def get_null():
         return "NUL"
     return "/dev/null"
 
-def generate_tex_file(expression):
-    """Generate tex file from expression"""
-    result = os.path.join(TEX_DIR_PATH, str(hash(expression))) + '.tex'
+TOOL_VERSIONS = {}
+
+def get_tool_version(tool):
+    """ Returns the first line printed by '<tool> --version' (computed once), or '' if 'tool' cannot be run. """
+    if not tool in TOOL_VERSIONS:
+        try:
+            output = subprocess.Popen([tool, '--version'], stdout = subprocess.PIPE, stderr = subprocess.PIPE).communicate()[0]
+            TOOL_VERSIONS[tool] = output.decode('utf-8', 'replace').split('\n')[0].strip()
+        except OSError:
+            TOOL_VERSIONS[tool] = ''
+    return TOOL_VERSIONS[tool]
+
+def get_tex_key(expression):
+    """ Returns a key identifying the result of compiling 'expression':
+    a hash of the expression, of the contents of the LaTeX template and of the versions of latex and dvisvgm.
+    Contrary to 'hash', the key does not change from one run to the next.
+    """
+    with open(TEMPLATE_LATEX_FILE_PATH, 'r') as infile:
+        template = infile.read()
+    if not isinstance(expression, bytes):
+        expression = expression.encode('utf-8')
+    content = '\n'.join([get_tool_version('latex'), get_tool_version('dvisvgm'), '']).encode('utf-8')
+    return hashlib.sha1(content + template + b'\n' + expression).hexdigest()
 
+def make_tex_dir():
     if not os.path.exists(TEX_DIR_PATH):
         os.mkdir(TEX_DIR_PATH)
         print("Subdirectory '%s' did not exist, has been created." % TEX_DIR_NAME)
     else:
         pass
 
+# Inserted before each expression to fix the height of the picture.
+TEX_HACK = '\n'.join(['\setlength{\unitlength}{1ex}%',
+                      '\\begin{picture}(0,1)',
+                      '\\put(0,0){\\line(0,1){1}}',
+                      '\\end{picture}%',
+                      '\\hspace{-0.75pt}%'])
+
+def get_tex_file_name(expression, extension = '.tex'):
+    return os.path.join(TEX_DIR_PATH, get_tex_key(expression)) + extension
+
+def generate_tex_file(expression):
+    """Generate tex file from expression"""
+    result = get_tex_file_name(expression)
+    make_tex_dir()
 
-    tex_hack =  '\n'.join(['\setlength{\unitlength}{1ex}%',
-                            '\\begin{picture}(0,1)',
-                            '\\put(0,0){\\line(0,1){1}}',
-                            '\\end{picture}%',
-                            '\\hspace{-0.75pt}%'])
     with open(TEMPLATE_LATEX_FILE_PATH, 'r') as infile:
         body = infile.read()
-        body = body.replace(TEX_TEXT_TO_REPLACE, '\n'.join([tex_hack, expression]))
+        body = body.replace(TEX_TEXT_TO_REPLACE, '\n'.join([TEX_HACK, expression]))
     
     with open (result, 'w') as outfile:
         outfile.write(body)
 
     return result
+
+def get_batch_template():
+    """ Returns the LaTeX template with the option 'multi' added to the class 'standalone',
+    so that each environment 'standalone' makes a page, or None if the template does not use this class.
+    """
+    with open(TEMPLATE_LATEX_FILE_PATH, 'r') as infile:
+        body = infile.read()
+    documentclass = re.search(r'^\\documentclass(\[([^\]]*)\])?\{standalone\}', body, re.M)
+    if documentclass == None:
+        return None
+    options = documentclass.group(2)
+    options = 'multi' if not options else options + ',multi'
+    return body[:documentclass.start()] + '\\documentclass[%s]{standalone}' % options + body[documentclass.end():]
+
+def generate_batch_tex_file(expressions):
+    """ Generates a single .tex file with one page (environment 'standalone', option 'multi') for each expression.
+    Returns its name, or None if the LaTeX template does not use the class 'standalone'.
+    """
+    body = get_batch_template()
+    if body == None:
+        return None
+    pages = ['\n'.join(['\\begin{standalone}', TEX_HACK, expression, '\\end{standalone}']) for expression in expressions]
+    body = body.replace(TEX_TEXT_TO_REPLACE, '\n'.join(pages))
+
+    key = hashlib.sha1(''.join(get_tex_key(expression) for expression in expressions).encode('utf-8')).hexdigest()
+    result = os.path.join(TEX_DIR_PATH, 'batch-' + key) + '.tex'
+    make_tex_dir()
+    with open(result, 'w') as outfile:
+        outfile.write(body)
+    return result
+
+def compile_tex_batch(expressions):
+    """ Compiles the expressions not compiled yet (see 'get_tex_key') with a single run of latex and of dvisvgm,
+    each page being saved in the .svg file of its expression.
+    If this fails, the expressions left are compiled one by one when needed (see 'container.get_tex_geometry').
+    """
+    pending = []
+    for expression in expressions:
+        if not os.path.exists(get_tex_file_name(expression, '.svg')) and not expression in pending:
+            pending.append(expression)
+    if len(pending) < 2:
+        return
+    tex_file_name = generate_batch_tex_file(pending)
+    if tex_file_name == None:
+        print("WARNING."),
+        print("LaTeX template does not use the class 'standalone', expressions will be compiled one by one.")
+        return
+    svg_file_names = dvi_to_svg(tex_to_dvi(tex_file_name, batch = True), page_count = len(pending))
+    for expression, svg_file_name in zip(pending, svg_file_names):
+        if os.path.exists(svg_file_name):
+            target = get_tex_file_name(expression, '.svg')
+            if os.path.exists(target):
+                os.remove(target)
+            os.rename(svg_file_name, target)
     
-def tex_to_dvi(tex_file):
-    """Run .tex file and return name of .dvi file"""
+# Precompiled formats (path without extension, or None if the format could not be made), by preamble key.
+TEX_FORMATS = {}
+
+def get_tex_format(batch = False):
+    """ Returns the path (without extension) of the format in which the preamble of the LaTeX template is precompiled
+    (with the option 'multi' if 'batch' is True, see 'get_batch_template'),
+    made once for each preamble and version of latex, or None if it cannot be made (or TEX_PRECOMPILE_PREAMBLE is False).
+    The format is made with the package 'mylatexformat', so that latex run with the format
+    skips the preamble of the .tex files instead of reading and parsing it again:
+    the .tex files must then have been generated from the same template.
+    """
+    if not TEX_PRECOMPILE_PREAMBLE:
+        return None
+    if batch:
+        template = get_batch_template()
+        if template == None:
+            return None
+    else:
+        with open(TEMPLATE_LATEX_FILE_PATH, 'r') as infile:
+            template = infile.read()
+    key = hashlib.sha1((get_tool_version('latex') + '\n').encode('utf-8') + template).hexdigest()
+    if not key in TEX_FORMATS:
+        result = os.path.join(TEX_DIR_PATH, 'preamble-' + key)
+        if not os.path.exists(result + '.fmt'):
+            make_tex_dir()
+            # The format is dumped from a copy of the template, the preamble being read up to '\begin{document}'.
+            with open(result + '.tex', 'w') as outfile:
+                outfile.write(template)
+            commands = [
+                "latex",
+                "-ini",
+                "-interaction=batchmode",
+                "-halt-on-error",
+                "-jobname=" + os.path.basename(result),
+                "-output-directory=" + TEX_DIR_PATH,
+                '"&latex"',
+                "mylatexformat.ltx",
+                '"%s"' % (result + '.tex'),
+                ">",
+                get_null()]
+            os.system(" ".join(commands))
+        if os.path.exists(result + '.fmt'):
+            TEX_FORMATS[key] = result
+        else:
+            print("WARNING."),
+            print("Could not precompile the preamble of the LaTeX template, it will be read on each run of latex.")
+            TEX_FORMATS[key] = None
+    return TEX_FORMATS[key]
+
+def tex_to_dvi(tex_file, batch = False):
+    """Run .tex file and return name of .dvi file.
+    'batch' tells whether the file was generated by 'generate_batch_tex_file' (see 'get_tex_format').
+    """
     result = tex_file.replace('.tex', '.dvi')
     commands = [
         "latex",
@@ -191,6 +366,9 @@ def tex_to_dvi(tex_file):
         tex_file,
         "> ",
         get_null()]
+    tex_format = get_tex_format(batch)
+    if not tex_format == None:
+        commands.insert(1, '-fmt="%s"' % tex_format)
 
     exit_code = os.system(" ".join(commands))
     if exit_code !=0:
@@ -199,9 +377,19 @@ def tex_to_dvi(tex_file):
         pass
     return result 
 
-def dvi_to_svg(dvi_file):
-    """Convert .dvi file to .svg file"""
-    result = dvi_file.replace(".dvi", ".svg")
+def dvi_to_svg(dvi_file, page_count = None):
+    """Convert .dvi file to .svg file.
+    If 'page_count' is specified, converts the pages 1 to 'page_count' to the .svg files returned as a list.
+    """
+    if page_count == None:
+        result = dvi_file.replace(".dvi", ".svg")
+        output = result
+    else:
+        # dvisvgm replaces %Np by the page number padded with zeros to N digits
+        # (by default, to the number of digits of the page count).
+        width = len(str(page_count))
+        result = [dvi_file.replace(".dvi", "-%s.svg" % str(i + 1).zfill(width)) for i in range(page_count)]
+        output = dvi_file.replace(".dvi", "-%%%sp.svg" % width)
     commands = [
         "dvisvgm",
         dvi_file,
@@ -209,10 +397,12 @@ def dvi_to_svg(dvi_file):
         "-v",
         "0", # 0 = no message output at all
         "-o",
-        result,
+        output,
         ">",
         get_null()
     ]
+    if not page_count == None:
+        commands.insert(2, "--page=1-%s" % page_count)
     os.system(" ".join(commands))
     return result
 
@@ -145,12 +145,16 @@ class Timeline(Monitor):
             print("WARNING (method 'all_times' of class 'Timeline')."),
             print("No graphics selected.")
         curves = get_subelements_by_class(self.graphics, [], Curve)
+        blocks = get_subelements_by_class(self.graphics, [], Block)
         result = [float(epoch)
                   for graphic in self.graphics
                   for epoch in graphic.epochs.values()]\
                  +  [float(epoch)
                      for curve in curves
-                     for effect in curve.effects for epoch in effect.epochs.values()]
+                     for effect in curve.effects for epoch in effect.epochs.values()]\
+                 +  [float(epoch)
+                     for block in blocks
+                     for effect in block.effects for epoch in effect.epochs.values()]
         return sorted(list(set(result)))
         
     def display(self):
@@ -209,7 +213,8 @@ class Timeline(Monitor):
             elif isinstance(graphic, Block):
                 effects = [effect
                            for element in graphic.elements if isinstance(element, Curve)
-                           for effect in element.effects]
+                           for effect in element.effects] \
+                          + graphic.effects
             else:
                 effects = []
             #
@@ -104,6 +104,52 @@ def extract_times(times_or_object, **kwargs):
 def  fit_within_epochs(t, obj):
     return max(min(t, obj.end()), obj.begin())
 
+class Epochs(object):
+    """ Compact replacement for a dictionary with keys 'begin time' and 'end time'.
+    Supports the same item access, as well as the methods 'keys', 'values' and 'items'.
+    """
+    __slots__ = ('begin_time', 'end_time')
+
+    def __init__(self, epochs = DEFAULT_EPOCHS):
+        self.begin_time = epochs['begin time']
+        self.end_time = epochs['end time']
+
+    def __getitem__(self, key):
+        if key == 'begin time':
+            return self.begin_time
+        elif key == 'end time':
+            return self.end_time
+        raise KeyError(key)
+
+    def __setitem__(self, key, value):
+        if key == 'begin time':
+            self.begin_time = value
+        elif key == 'end time':
+            self.end_time = value
+        else:
+            raise KeyError(key)
+
+    def __iter__(self):
+        return iter(EPOCH_TAGS)
+
+    def __contains__(self, key):
+        return key in EPOCH_TAGS
+
+    def __len__(self):
+        return 2
+
+    def __repr__(self):
+        return repr(dict(self.items()))
+
+    def keys(self):
+        return list(EPOCH_TAGS)
+
+    def values(self):
+        return [self.begin_time, self.end_time]
+
+    def items(self):
+        return zip(EPOCH_TAGS, self.values())
+
 # -------------------- CLASSES --------------------
 class Primitive(object):
     """ Attributes: 
@@ -111,11 +157,12 @@ class Primitive(object):
     - masters
     - epochs
     """
+    __slots__ = ('name', 'masters', 'epochs')
 
     def __init__(self):
         self.name = str(id(self))
         self.masters = []
-        self.epochs = dict(DEFAULT_EPOCHS)
+        self.epochs = Epochs()
 
     def record_name(self):
         frame_locals = inspect.currentframe().f_back.f_locals
@@ -140,13 +187,6 @@ class Primitive(object):
     def lifespan(self):
         return self.epochs['end time'] - self.epochs['begin time']
 
-    def name(self):
-        frame_locals = inspect.currentframe().f_back.f_back.f_locals
-        primitives = filter_by_class(frame_locals, Primitive, option = 'inclusive')
-        
-        return find_name(self, primitives)
-
-
 
     # -------------------- SYNCHRONIZATION METHODS --------------------
     def set_times(self, times_or_object, **kwargs):
@@ -245,8 +285,7 @@ class Primitive(object):
         print('{0:>8}'.format('(' + str(int(self.lifespan()/float(SECONDS))) + 'sec)')),
 
     def report(self, indent = '', **kwargs):
-        self.w = 14
-        w = self.w
+        w = 14
         indent = indent
         if 'primitives' in kwargs.keys():
             primitives = kwargs['primitives']